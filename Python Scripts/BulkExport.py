@@ -0,0 +1,195 @@
+import xml.etree.ElementTree as ET
+import os
+import csv
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from ExtractPatentElements import ElementVariations, create_variations_map
+from IngestPipeline import patent_number_from_filename
+from XmlBackends import get_backend
+
+'''
+
+Exports the content of a list of elements (eg: Patents.txt) for every patent of a folder.
+
+- Files are sorted and cut into fixed shards, each shard is written by one worker process
+- Shard content only depends on its files, so the output is identical whatever the number of workers
+- Shards are written to a temporary file and renamed when complete, a rerun skips finished shards
+  whose files did not change (the manifest keeps the source folder and a hash of every shard's files)
+- Output is JSONL or CSV, one row per element found:
+    patent_number, file, element, occurrence, value
+  value is the element text ('text' mode) or the serialized subtree ('xml' mode)
+
+'''
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+VALUE_MODES = ('text', 'xml')
+CSV_COLUMNS = ['patent_number', 'file', 'element', 'occurrence', 'value']
+MANIFEST_NAME = 'export_manifest.json'
+
+# Yields the export rows of a single XML file, elements in document order
+def export_rows(file_path, variations_map, value_mode='text'):
+    try:
+        root = get_backend('tree').parse(file_path)
+    except ET.ParseError as e:
+        print(f"Error parsing {file_path}: {e}")
+        return
+    filename = os.path.basename(file_path)
+    patent_number = patent_number_from_filename(filename)
+    occurrences = {}
+    for elem in root.iter():
+        element_name = variations_map.get(ElementVariations.normalize_element(elem.tag))
+        if element_name is None:
+            continue
+        occurrence = occurrences.get(element_name, 0)
+        occurrences[element_name] = occurrence + 1
+        if value_mode == 'xml':
+            # The text after the element belongs to its parent, it is left out
+            tail, elem.tail = elem.tail, None
+            value = ET.tostring(elem, encoding='unicode')
+            elem.tail = tail
+        else:
+            value = ' '.join(text.strip() for text in elem.itertext() if text.strip())
+        yield {'patent_number': patent_number, 'file': filename, 'element': element_name,
+               'occurrence': occurrence, 'value': value}
+
+def shard_path(output_dir, shard_number, export_format):
+    return os.path.join(output_dir, f"export-{shard_number:05d}.{export_format}")
+
+# Hash of the names, sizes and modification times of the files of a shard
+def shard_hash(file_paths):
+    digest = hashlib.blake2b(digest_size=16)
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        digest.update(f"{os.path.basename(file_path)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+# Set once in every worker process so the map is not sent with each shard
+_worker_variations_map = None
+
+def _init_worker(variations_map):
+    global _worker_variations_map
+    _worker_variations_map = variations_map
+
+# Worker: writes one complete shard (runs in a separate process)
+def export_shard(task):
+    shard_number, file_paths, output_dir, export_format, value_mode = task
+    variations_map = _worker_variations_map
+    final_path = shard_path(output_dir, shard_number, export_format)
+    temporary_path = final_path + '.part'
+    rows_written = 0
+    with open(temporary_path, 'w', encoding='utf-8', newline='') as output_file:
+        writer = csv.DictWriter(output_file, fieldnames=CSV_COLUMNS) if export_format == 'csv' else None
+        if writer:
+            writer.writeheader()
+        for file_path in file_paths:
+            for row in export_rows(file_path, variations_map, value_mode):
+                if writer:
+                    writer.writerow(row)
+                else:
+                    output_file.write(json.dumps(row, ensure_ascii=False) + '\n')
+                rows_written += 1
+    os.replace(temporary_path, final_path)
+    return shard_number, rows_written
+
+class BulkExporter:
+    def __init__(self, xml_files_dir, output_dir, variations_map, export_format='jsonl',
+                 value_mode='text', files_per_shard=500, workers=None):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {export_format}")
+        if value_mode not in VALUE_MODES:
+            raise ValueError(f"Unknown value mode: {value_mode}")
+        self.xml_files_dir = xml_files_dir
+        self.output_dir = output_dir
+        self.variations_map = variations_map
+        self.export_format = export_format
+        self.value_mode = value_mode
+        self.files_per_shard = files_per_shard
+        self.workers = workers or os.cpu_count()
+
+    def list_xml_files(self):
+        return sorted(os.path.join(self.xml_files_dir, f) for f in os.listdir(self.xml_files_dir)
+                      if f.lower().endswith('.xml'))
+
+    def plan_shards(self):
+        xml_files = self.list_xml_files()
+        return [xml_files[i:i + self.files_per_shard] for i in range(0, len(xml_files), self.files_per_shard)]
+
+    # The manifest records the settings of a run and the files of every shard.
+    # Resuming with different settings (or another source) starts over, a shard whose files changed is redone.
+    def _check_manifest(self, shards):
+        manifest = {
+            'source': os.path.abspath(self.xml_files_dir),
+            'format': self.export_format,
+            'value_mode': self.value_mode,
+            'files_per_shard': self.files_per_shard,
+            'elements': sorted(set(self.variations_map.values())),
+            'shards': [shard_hash(file_paths) for file_paths in shards],
+        }
+        manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                previous = json.load(f)
+            previous_shards = previous.pop('shards', [])
+            if previous == {key: value for key, value in manifest.items() if key != 'shards'}:
+                for shard_number in range(max(len(previous_shards), len(manifest['shards']))):
+                    if (shard_number >= len(previous_shards) or shard_number >= len(manifest['shards'])
+                            or previous_shards[shard_number] != manifest['shards'][shard_number]):
+                        stale_path = shard_path(self.output_dir, shard_number, self.export_format)
+                        if os.path.exists(stale_path):
+                            os.remove(stale_path)
+            else:
+                for filename in os.listdir(self.output_dir):
+                    if filename.startswith('export-'):
+                        os.remove(os.path.join(self.output_dir, filename))
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    # Exports every shard not already on disk.
+    # Returns the number of (shards exported, shards skipped, rows written).
+    def run(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        shards = self.plan_shards()
+        self._check_manifest(shards)
+
+        tasks = [(shard_number, file_paths, self.output_dir, self.export_format, self.value_mode)
+                 for shard_number, file_paths in enumerate(shards)
+                 if not os.path.exists(shard_path(self.output_dir, shard_number, self.export_format))]
+        rows_written = 0
+        if tasks:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(self.variations_map,)) as executor:
+                for _, rows in executor.map(export_shard, tasks):
+                    rows_written += rows
+        return len(tasks), len(shards) - len(tasks), rows_written
+
+# Variations map for element names given directly instead of through Patents.txt
+def variations_map_for(element_names):
+    variations_map = {}
+    for element in element_names:
+        variations_map.update(ElementVariations.generate_variations(element))
+    return variations_map
+
+def setup_paths():
+    data_dir = 'C:/Users/haddadm1/Desktop/Random Things/dd_Patent_Element_Testing'
+    patents_path = os.path.join(data_dir, 'Patents.txt')
+    sample_dir = os.path.join(data_dir, 'Sample')
+    export_dir = os.path.join(data_dir, 'Export')
+    return data_dir, patents_path, sample_dir, export_dir
+
+# Executes functions in sequential order
+def main():
+    start_time = time.time()
+
+    data_dir, patents_path, sample_dir, export_dir = setup_paths()
+    variations_map = create_variations_map(patents_path)
+    exporter = BulkExporter(sample_dir, export_dir, variations_map)
+    exported, skipped, rows = exporter.run()
+    print(f"Exported {exported} shard(s) ({rows} rows), skipped {skipped} already complete shard(s).")
+
+    end_time = time.time()
+    print(f"The script took {end_time - start_time:.4f} seconds to complete.")
+
+if __name__ == "__main__":
+    main()
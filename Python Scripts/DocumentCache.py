@@ -0,0 +1,386 @@
+import xml.etree.ElementTree as ET
+import os
+import sys
+import mmap
+import time
+import struct
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from XmlBackends import get_backend
+
+'''
+
+Disk cache of parsed documents in a binary form that is read without parsing, so a patent opened
+in an earlier session does not have to be parsed again.
+
+- A cached document is one file named after the path, size and modification time of the XML file
+  (a changed file simply gets another entry, the old one ages out)
+- What is saved is the parse, not space: an entry is about as big as the XML file, up to a third
+  bigger for documents with many small elements (22 bytes of columns per element)
+- Layout: header (32 bytes), tag table, attribute name table, int32 columns, uint16 columns, text blob,
+  every section starts at a multiple of 4 bytes so the columns are read in place with their alignment
+    end                      elements in document order, end = index after the last descendant
+    blob start               where the text, tail and attribute values of an element start in the blob
+    text, tail               length in characters (-1 for None), the blob is read in order
+    attribute start          per element start in the attribute columns (attribute value length)
+    tag, attribute name      ids in the tag and attribute name tables
+- Files are memory-mapped: opening one only decodes the two tables, the columns are read in place
+- The list of tags of a document is the tag table, an element and its descendants are rebuilt as
+  ElementTree elements on demand (the blob of the subtree is decoded once), without parsing anything
+- Rebuilding is slower per element than parsing, cheaper_than_parsing() tells the engine when it pays
+- The total size on disk is capped, least recently used entries are deleted first
+  (an entry is touched every time it is used, so the order survives restarts)
+
+'''
+
+_MAGIC = b'PDC3'
+# magic, byte order, elements, attributes, tag table bytes, attribute name table bytes, blob bytes
+# (padded to 32 bytes, the int32 columns that follow the tables must start at a multiple of 4)
+_HEADER = struct.Struct('<4s1sxxxIIIIQ')
+_BYTE_ORDER = b'L' if sys.byteorder == 'little' else b'B'
+CACHE_SUFFIX = '.pdc'
+# Rebuilding an element costs about as much as parsing REBUILD_COST elements of the file
+REBUILD_COST = 3
+
+def _pad(n, size=4):
+    return (size - n % size) % size
+
+# Binary form of a parsed document (root element and everything under it).
+# Raises OverflowError for a document with more than 65536 distinct tags or attribute names (uint16 ids).
+def encode_document(root):
+    tag_ids = {}
+    name_ids = {}
+    tags = array('H')
+    ends = array('i')
+    blob_starts = array('i')
+    text_lengths = array('i')
+    tail_lengths = array('i')
+    attribute_starts = array('i')
+    attribute_names = array('H')
+    value_lengths = array('i')
+    blob = bytearray()
+
+    def add_text(text, lengths):
+        if text is None:
+            lengths.append(-1)
+        else:
+            lengths.append(len(text))
+            blob.extend(text.encode('utf-8'))
+
+    # Iterative pre-order walk, ends are filled once a subtree is done
+    stack = [(root, -1)]
+    while stack:
+        elem, closing = stack.pop()
+        if elem is None:
+            ends[closing] = len(tags)
+            continue
+        index = len(tags)
+        tags.append(tag_ids.setdefault(elem.tag, len(tag_ids)))
+        ends.append(0)
+        blob_starts.append(len(blob))
+        add_text(elem.text, text_lengths)
+        add_text(elem.tail, tail_lengths)
+        attribute_starts.append(len(attribute_names))
+        for name, value in elem.items():
+            attribute_names.append(name_ids.setdefault(name, len(name_ids)))
+            add_text(value, value_lengths)
+        stack.append((None, index))
+        stack.extend((child, -1) for child in reversed(elem))
+    blob_starts.append(len(blob))
+    attribute_starts.append(len(attribute_names))
+
+    tag_table = '\0'.join(tag_ids).encode('utf-8')
+    name_table = '\0'.join(name_ids).encode('utf-8')
+    parts = [_HEADER.pack(_MAGIC, _BYTE_ORDER, len(tags), len(attribute_names),
+                          len(tag_table), len(name_table), len(blob)),
+             tag_table, b'\0' * _pad(len(tag_table)),
+             name_table, b'\0' * _pad(len(name_table))]
+    for column in (ends, blob_starts, text_lengths, tail_lengths, attribute_starts, value_lengths, tags, attribute_names):
+        parts.append(column.tobytes())
+    n_shorts = len(tags) + len(attribute_names)
+    parts.append(b'\0' * _pad(n_shorts * 2))
+    parts.append(bytes(blob))
+    return b''.join(parts)
+
+# A cached document, read in place from a buffer (usually a memory-mapped file)
+class CompactDocument:
+    def __init__(self, buffer):
+        magic, byte_order, n_elements, n_attributes, tag_bytes, name_bytes, blob_bytes = _HEADER.unpack_from(buffer, 0)
+        if magic != _MAGIC or byte_order != _BYTE_ORDER:
+            raise ValueError("Not a cached document (or written on another platform)")
+        self.buffer = buffer
+        position = _HEADER.size
+        self.tags = bytes(buffer[position:position + tag_bytes]).decode('utf-8').split('\0') if n_elements else []
+        position += tag_bytes + _pad(tag_bytes)
+        names = bytes(buffer[position:position + name_bytes]).decode('utf-8')
+        self.attribute_names = names.split('\0') if n_attributes else []
+        position += name_bytes + _pad(name_bytes)
+
+        n_ints = n_elements * 3 + 2 * (n_elements + 1) + n_attributes
+        n_shorts = n_elements + n_attributes
+        self.view = memoryview(buffer)
+        self.ints = self.view[position:position + n_ints * 4].cast('i')
+        position += n_ints * 4
+        self.shorts = self.view[position:position + n_shorts * 2].cast('H')
+        position += n_shorts * 2 + _pad(n_shorts * 2)
+        columns = []
+        offset = 0
+        for size in (n_elements, n_elements + 1, n_elements, n_elements, n_elements + 1, n_attributes):
+            columns.append(self.ints[offset:offset + size])
+            offset += size
+        columns.append(self.shorts[:n_elements])
+        columns.append(self.shorts[n_elements:])
+        (self.ends, self.blob_starts, self.text_lengths, self.tail_lengths, self.attribute_starts,
+         self.value_lengths, self.tag_column, self.attribute_name_column) = columns
+        self.columns = columns
+        self.blob_start = position
+        if self.blob_start + blob_bytes > len(buffer):
+            raise ValueError("Truncated cached document")
+        self.n_elements = n_elements
+
+    @staticmethod
+    def open(path):
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return CompactDocument(data)
+
+    def __len__(self):
+        return self.n_elements
+
+    # Every distinct tag of the document
+    def element_tags(self):
+        return list(self.tags)
+
+    # Indexes of the elements with this exact tag, in document order
+    def find(self, tag):
+        try:
+            tag_id = self.tags.index(tag)
+        except ValueError:
+            return []
+        return [index for index, value in enumerate(self.tag_column.tolist()) if value == tag_id]
+
+    # True if rebuilding these elements (and their descendants) is cheaper than parsing the whole file
+    def cheaper_than_parsing(self, indexes):
+        ends = self.ends
+        return sum(ends[index] - index for index in indexes) * REBUILD_COST < self.n_elements
+
+    # Rebuilds element `index` and its descendants (tail included, like the element found in the parsed tree)
+    def element(self, index=0):
+        end = self.ends[index]
+        # Columns of the subtree as lists, its text decoded once
+        ends = self.ends[index:end].tolist()
+        text_lengths = self.text_lengths[index:end].tolist()
+        tail_lengths = self.tail_lengths[index:end].tolist()
+        tag_column = self.tag_column[index:end].tolist()
+        attribute_starts = self.attribute_starts[index:end + 1].tolist()
+        first_attribute = attribute_starts[0]
+        attribute_name_column = self.attribute_name_column[first_attribute:attribute_starts[-1]].tolist()
+        value_lengths = self.value_lengths[first_attribute:attribute_starts[-1]].tolist()
+        start = self.blob_start + self.blob_starts[index]
+        text = self.buffer[start:self.blob_start + self.blob_starts[end]].decode('utf-8')
+
+        tags = self.tags
+        names = self.attribute_names
+        sub_element = ET.SubElement
+        cursor = 0
+        first = None
+        # (element, end) of the open ancestors
+        open_elements = []
+        for position in range(end - index):
+            length = text_lengths[position]
+            if length < 0:
+                elem_text = None
+            else:
+                elem_text = text[cursor:cursor + length]
+                cursor += length
+            length = tail_lengths[position]
+            if length < 0:
+                elem_tail = None
+            else:
+                elem_tail = text[cursor:cursor + length]
+                cursor += length
+            attributes = {}
+            if attribute_starts[position] != attribute_starts[position + 1]:
+                for a in range(attribute_starts[position] - first_attribute, attribute_starts[position + 1] - first_attribute):
+                    length = value_lengths[a]
+                    attributes[names[attribute_name_column[a]]] = text[cursor:cursor + length]
+                    cursor += length
+            absolute = index + position
+            while open_elements and open_elements[-1][1] <= absolute:
+                open_elements.pop()
+            if open_elements:
+                elem = sub_element(open_elements[-1][0], tags[tag_column[position]], attributes)
+            else:
+                elem = first = ET.Element(tags[tag_column[position]], attributes)
+            elem.text = elem_text
+            elem.tail = elem_tail
+            if ends[position] > absolute + 1:
+                open_elements.append((elem, ends[position]))
+        return first
+
+    # Elements matching './/' + tag (the root itself is never part of the result)
+    def iter_descendants(self, tag, indexes=None):
+        for index in self.find(tag) if indexes is None else indexes:
+            if index != 0:
+                yield self.element(index)
+
+    # Views have to be released before the map can be closed
+    def close(self):
+        for column in self.columns:
+            column.release()
+        self.ints.release()
+        self.shorts.release()
+        self.view.release()
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+class DocumentCache:
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        # Entries from older sessions, least recently used first
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith(CACHE_SUFFIX):
+                stat = os.stat(os.path.join(cache_dir, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        self.entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.total_bytes = sum(self.entries.values())
+
+    @staticmethod
+    def from_megabytes(cache_dir, megabytes):
+        return DocumentCache(cache_dir, int(megabytes * 1024 * 1024))
+
+    # From the file metadata only, the content is never read to look an entry up
+    def key_for(self, file_path):
+        stat = os.stat(file_path)
+        signature = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.blake2b(signature.encode('utf-8'), digest_size=20).hexdigest()
+
+    def _entry_path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    # Cached form of a file, None if it is not there
+    def get(self, file_path):
+        name = self.key_for(file_path) + CACHE_SUFFIX
+        with self.lock:
+            if name not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(name)
+        try:
+            document = CompactDocument.open(self._entry_path(name))
+            os.utime(self._entry_path(name))
+        except (OSError, ValueError, struct.error):
+            self._forget(name)
+            return None
+        with self.lock:
+            self.hits += 1
+        return document
+
+    # Stores the parsed root of a file (no-op if it is already there, or if it cannot be encoded)
+    def put(self, file_path, root):
+        name = self.key_for(file_path) + CACHE_SUFFIX
+        with self.lock:
+            if name in self.entries:
+                return
+        try:
+            data = encode_document(root)
+        except OverflowError:
+            return
+        if len(data) > self.max_bytes:
+            return
+        entry_path = self._entry_path(name)
+        temporary_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(data)
+        os.replace(temporary_path, entry_path)
+        with self.lock:
+            self.entries[name] = len(data)
+            self.total_bytes += len(data)
+        self.evict()
+
+    def _forget(self, name):
+        with self.lock:
+            size = self.entries.pop(name, None)
+            if size is not None:
+                self.total_bytes -= size
+        try:
+            os.remove(self._entry_path(name))
+        except OSError:
+            pass
+
+    # Deletes least recently used entries until the cache fits in max_bytes.
+    # An entry still mapped by a reader cannot be deleted on Windows, it is kept for the next eviction.
+    def evict(self):
+        while True:
+            with self.lock:
+                if self.total_bytes <= self.max_bytes or not self.entries:
+                    return
+                name, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+            try:
+                os.remove(self._entry_path(name))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                with self.lock:
+                    self.entries[name] = size
+                    self.total_bytes += size
+                return
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.total_bytes, 'hits': self.hits, 'misses': self.misses}
+
+def setup_paths():
+    data_dir = 'C:/Users/haddadm1/Desktop/Random Things/dd_Patent_Element_Testing'
+    sample_dir = os.path.join(data_dir, 'Sample')
+    cache_dir = os.path.join(data_dir, 'Document Cache')
+    return data_dir, sample_dir, cache_dir
+
+# Fills the cache for a folder, then compares reopening from the cache with parsing again
+def main():
+    start_time = time.time()
+    data_dir, sample_dir, cache_dir = setup_paths()
+    if len(sys.argv) > 1:
+        sample_dir = sys.argv[1]
+    cache = DocumentCache(cache_dir)
+    backend = get_backend('tree')
+    xml_files = sorted(os.path.join(sample_dir, f) for f in os.listdir(sample_dir) if f.lower().endswith('.xml'))
+
+    started = time.perf_counter()
+    for file_path in xml_files:
+        try:
+            backend.parse(file_path)
+        except ET.ParseError as e:
+            print(f"Error parsing {file_path}: {e}")
+    parse_seconds = time.perf_counter() - started
+
+    for file_path in xml_files:
+        if cache.get(file_path) is None:
+            try:
+                cache.put(file_path, backend.parse(file_path))
+            except ET.ParseError:
+                continue
+
+    started = time.perf_counter()
+    for file_path in xml_files:
+        document = cache.get(file_path)
+        if document is not None:
+            document.element_tags()
+    cached_seconds = time.perf_counter() - started
+    print(f"Parse: {parse_seconds:.4f}s, open from cache (tag list): {cached_seconds:.4f}s for {len(xml_files)} file(s)")
+    print(cache.stats())
+
+    end_time = time.time()
+    print(f"The script took {end_time - start_time:.4f} seconds to complete.")
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,10 @@
-import xml.etree.ElementTree as ET
 import os
-import zipfile
+import sys
 import time
-
-# Extracts ZIP file, then extracts XML files and finds elements within them
-    # Verifies that the file is an XML file
-    # Returns error if XML file cannot be parsed
-class Extractor:
-    @staticmethod
-    def extract_elements_from_xml(file_path):
-        elements = set()
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            for elem in root.iter():
-                elements.add(elem.tag)
-        except ET.ParseError as e:
-            print(f"Error parsing {file_path}: {e}")
-        return elements
-
-    @staticmethod
-    def extract_zip(zip_path, extract_to):
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_to)
-
-    @staticmethod
-    def find_elements_in_xml_files(xml_files_dir):
-        master_set = set()
-        xml_files = [f for f in os.listdir(xml_files_dir) if f.endswith('.xml')]
-        for xml_file in xml_files:
-            file_path = os.path.join(xml_files_dir, xml_file)
-            elements = Extractor.extract_elements_from_xml(file_path)
-            master_set.update(elements)
-        return master_set
+from IngestPipeline import TagSetAnalyzer, StatsAnalyzer
+from ScanEngine import ScanEngine
+from ScanCheckpoint import ScanCheckpoint
+from PathQuery import TagIndexAnalyzer, QueryAnalyzer, write_tag_index, print_query_counts
 
 def write_master_list(data_dir, master_set):
     output_path = os.path.join(data_dir, 'Output_ListOfAllElementsInXMLFiles.txt')
@@ -47,17 +19,38 @@ def setup_paths():
     return data_dir, sample_zip_path, sample_dir
 
 # For error handling
-def check_sample_exists(sample_zip_path, sample_dir):
+# The ZIP file is only streamed (and extracted) if the sample directory does not exist yet,
+# or if an interrupted run was extracting it (the directory is then incomplete)
+def select_source(sample_zip_path, sample_dir, checkpoint_path=None):
     if not os.path.exists(sample_dir):
-        Extractor.extract_zip(sample_zip_path, sample_dir)
+        return sample_zip_path
+    if ScanCheckpoint.pending_source(checkpoint_path) == os.path.abspath(sample_zip_path):
+        return sample_zip_path
+    return sample_dir
 
 # Executes functions in sequential order
+# Extraction and scanning happen in a single streaming pass (see ScanEngine)
+# Path queries given on the command line are counted in the same pass (see PathQuery.py)
 def main():
     start_time = time.time()
     data_dir, sample_zip_path, sample_dir = setup_paths()
-    check_sample_exists(sample_zip_path, sample_dir)
-    master_set = Extractor.find_elements_in_xml_files(sample_dir)
-    write_master_list(data_dir, master_set)
+    checkpoint_path = os.path.join(data_dir, 'ExtractAllElements.checkpoint')
+    source = select_source(sample_zip_path, sample_dir, checkpoint_path)
+    scan_engine = ScanEngine()
+    scan_engine.register('all_tags', TagSetAnalyzer())
+    stats_analyzer = scan_engine.register('stats', StatsAnalyzer())
+    scan_engine.register('tag_index', TagIndexAnalyzer())
+    queries = sys.argv[1:]
+    for query in queries:
+        scan_engine.register(query, QueryAnalyzer(query))
+    # Resumes from the last checkpoint if a previous run was interrupted
+    results = scan_engine.run(source, sample_dir, checkpoint_path)
+    for file_path, error in stats_analyzer.errors:
+        print(f"Error parsing {file_path}: {error}")
+    write_master_list(data_dir, results['all_tags'])
+    write_tag_index(sample_dir, results['tag_index'])
+    print_query_counts(queries, results)
+    print(scan_engine.report())
     end_time = time.time()
     print(f"The script took {end_time - start_time:.4f} seconds to complete.")
 
@@ -1,8 +1,11 @@
-import xml.etree.ElementTree as ET
 import os
-import zipfile
+import sys
 import time
 import re
+from IngestPipeline import StatsAnalyzer
+from ScanEngine import ScanEngine
+from ScanCheckpoint import ScanCheckpoint
+from PathQuery import TagIndexAnalyzer, QueryAnalyzer, write_tag_index, print_query_counts
 
 '''
 
@@ -43,42 +46,6 @@ class ElementVariations:
         normalized = tag.split('}', 1)[-1].lower()
         return ElementVariations.dash_to_camel(normalized)
 
-# Extracts ZIP file, then extracts XML files and finds elements within them
-    # Verifies that the file is an XML file
-    # Returns error if XML file cannot be parsed
-class Extractor:
-    @staticmethod
-    def extract_elements_from_xml(file_path):
-        if not file_path.lower().endswith('.xml'):
-            return set()
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            return {elem.tag for elem in root.iter()}
-        except ET.ParseError as e:
-            print(f"Error parsing {file_path}: {e}")
-            return set()
-
-    @staticmethod
-    def find_elements_in_xml_files(xml_files_dir, variations_map):
-        master_list = set()
-        xml_files = os.listdir(xml_files_dir)
-        for xml_file in xml_files:
-            file_path = os.path.join(xml_files_dir, xml_file)
-            if not os.path.isfile(file_path):
-                continue
-            elements = Extractor.extract_elements_from_xml(file_path)
-            for element in elements:
-                normalized_element = ElementVariations.normalize_element(element)
-                if normalized_element in variations_map:
-                    master_list.add(variations_map[normalized_element])
-        return master_list
-
-    @staticmethod
-    def extract_zip(zip_path, extract_to):
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_to)
-
 def setup_paths():
     data_dir = 'C:/Users/haddadm1/Desktop/Random Things/dd_Patent_Element_Testing'
     patents_path = os.path.join(data_dir, 'Patents.txt')
@@ -96,9 +63,14 @@ def check_for_nested_directory(sample_dir):
         os.rmdir(nested_sample_dir)
 
 # For error handling
-def check_sample_exists(sample_zip_path, sample_dir):
+# The ZIP file is only streamed (and extracted) if the sample directory does not exist yet,
+# or if an interrupted run was extracting it (the directory is then incomplete)
+def select_source(sample_zip_path, sample_dir, checkpoint_path=None):
     if not os.path.exists(sample_dir):
-        Extractor.extract_zip(sample_zip_path, sample_dir)
+        return sample_zip_path
+    if ScanCheckpoint.pending_source(checkpoint_path) == os.path.abspath(sample_zip_path):
+        return sample_zip_path
+    return sample_dir
 
 # Creates a map of variations for each element in the patents file
 def create_variations_map(patents_path):
@@ -112,6 +84,36 @@ def create_variations_map(patents_path):
                     variations_map[variation] = original
     return variations_map
 
+# Keeps only the tags that match an ST.96 element (or one of its variations)
+def filter_patent_elements(elements, variations_map):
+    master_list = set()
+    for element in elements:
+        normalized_element = ElementVariations.normalize_element(element)
+        if normalized_element in variations_map:
+            master_list.add(variations_map[normalized_element])
+    return master_list
+
+# Scan engine analyzer: ST.96 elements (original names from Patents.txt) found in the corpus.
+# Every distinct tag is normalized only once, whatever the number of files.
+class VocabularyAnalyzer:
+    needs = 'tags'
+
+    def __init__(self, variations_map):
+        self.variations_map = variations_map
+        self.seen_tags = set()
+        self.master_list = set()
+
+    def consume(self, doc):
+        if doc.tags is None:
+            return
+        new_tags = doc.tags - self.seen_tags
+        if new_tags:
+            self.seen_tags.update(new_tags)
+            self.master_list.update(filter_patent_elements(new_tags, self.variations_map))
+
+    def result(self):
+        return self.master_list
+
 def write_master_list(data_dir, master_list_of_elements):
     output_path = os.path.join(data_dir, 'Output_ListOfPatentsInXMLFiles.txt')
     with open(output_path, 'w') as output_file:
@@ -119,15 +121,33 @@ def write_master_list(data_dir, master_list_of_elements):
             output_file.write(f"{element}\n")
 
 # Executes functions in sequential order
+# Path queries given on the command line are counted in the same pass (see PathQuery.py)
 def main():
     start_time = time.time()
     
     data_dir, patents_path, sample_zip_path, sample_dir = setup_paths()
-    check_sample_exists(sample_zip_path, sample_dir)
+    checkpoint_path = os.path.join(data_dir, 'ExtractPatentElements.checkpoint')
+    source = select_source(sample_zip_path, sample_dir, checkpoint_path)
     check_for_nested_directory(sample_dir)
     variations_map = create_variations_map(patents_path)
-    master_list_of_elements = Extractor.find_elements_in_xml_files(sample_dir, variations_map)
-    write_master_list(data_dir, master_list_of_elements)
+    scan_engine = ScanEngine()
+    scan_engine.register('patent_elements', VocabularyAnalyzer(variations_map))
+    stats_analyzer = scan_engine.register('stats', StatsAnalyzer())
+    scan_engine.register('tag_index', TagIndexAnalyzer())
+    queries = sys.argv[1:]
+    for query in queries:
+        scan_engine.register(query, QueryAnalyzer(query))
+    # Resumes from the last checkpoint if a previous run was interrupted
+    results = scan_engine.run(source, sample_dir, checkpoint_path)
+    check_for_nested_directory(sample_dir)
+    for file_path, error in stats_analyzer.errors:
+        print(f"Error parsing {file_path}: {error}")
+    write_master_list(data_dir, results['patent_elements'])
+    # Files now sit directly in the sample folder
+    results['tag_index'].relocate(lambda path: os.path.join(sample_dir, os.path.basename(path)))
+    write_tag_index(sample_dir, results['tag_index'])
+    print_query_counts(queries, results)
+    print(scan_engine.report())
     
     end_time = time.time()
     print(f"The script took {end_time - start_time:.4f} seconds to complete.")
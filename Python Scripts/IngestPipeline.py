@@ -0,0 +1,380 @@
+import xml.etree.ElementTree as ET
+import os
+import zipfile
+import queue
+import threading
+import time
+from XmlBackends import get_backend
+
+'''
+
+Streaming ingest of a weekly drop (ZIP file or already extracted folder).
+
+Stages, each connected by a bounded queue so memory stays flat:
+    reader -> parser workers -> analyzers -> writers
+
+- Every member is read once and parsed at most once, with the cheapest backend the analyzers allow
+  (no parse, expat tags-only, or a full ElementTree tree)
+- Analyzers (index, tag sets, stats) all see the same parsed document
+- Writers put the raw bytes on disk, replacing the old extractall() step
+- Every stage keeps its own counters, report() shows which one is the bottleneck
+- With a ScanCheckpoint, analyzer state and the files done are saved as the scan goes,
+  a rerun after a crash or Ctrl-C skips them (see ScanCheckpoint.py)
+
+'''
+
+# Marks the end of the stream on a queue
+_DONE = object()
+
+# Returns the patent number from a BFT file name (CA-BFT-0321670-20240325.xml -> 321670)
+def patent_number_from_filename(filename):
+    parts = os.path.basename(filename).split('-')
+    if len(parts) > 2 and parts[2].isdigit():
+        return parts[2].lstrip('0')
+    return None
+
+# Tag without its namespace ({uri}local or prefix:local -> local), case kept
+def local_name(tag):
+    return tag.split('}', 1)[-1].split(':')[-1]
+
+# Builds a safe path inside extract_to for a ZIP member name (no absolute paths or '..')
+def member_target_path(extract_to, member_name):
+    parts = [part for part in member_name.replace('\\', '/').split('/') if part not in ('', '.', '..')]
+    return os.path.join(extract_to, *parts)
+
+# One file travelling through the pipeline.
+# root stays None unless an analyzer needs the tree, tags/element_count are set whenever the file was parsed.
+# error is set if parsing failed.
+# done is set for a member already analyzed by an interrupted run that only has to be written again.
+class Document:
+    __slots__ = ('name', 'path', 'data', 'root', 'tags', 'element_count', 'error', 'done')
+
+    def __init__(self, name, path, data):
+        self.name = name
+        self.path = path
+        self.data = data
+        self.root = None
+        self.tags = None
+        self.element_count = 0
+        self.error = None
+        self.done = False
+
+    def is_xml(self):
+        return self.name.lower().endswith('.xml')
+
+# Counts items, bytes and busy time for a single stage.
+# Several worker threads may share the same stats object.
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, n_bytes, seconds):
+        with self.lock:
+            self.items += 1
+            self.bytes += n_bytes
+            self.busy += seconds
+
+    def throughput(self):
+        if self.busy <= 0:
+            return 0.0
+        return self.items / self.busy
+
+    def __str__(self):
+        mb_per_s = (self.bytes / (1024 * 1024)) / self.busy if self.busy > 0 else 0.0
+        return f"{self.name:<10} {self.items:>8} files {self.busy:>9.3f}s busy {self.throughput():>10.1f} files/s {mb_per_s:>8.2f} MB/s"
+
+# Analyzers declare what they need from the parser stage with 'needs':
+    # None   -> raw bytes only
+    # 'tags' -> doc.tags / doc.element_count (expat, no tree)
+    # 'tree' -> doc.root as well (ElementTree)
+
+# Maps patent numbers to the path of their XML file (same index as patent_file_index.pkl)
+class IndexAnalyzer:
+    needs = None
+
+    def __init__(self):
+        self.index = {}
+
+    def consume(self, doc):
+        if doc.is_xml():
+            patent_number = patent_number_from_filename(doc.name)
+            if patent_number:
+                self.index[patent_number] = doc.path
+
+    def result(self):
+        return self.index
+
+# Union of every tag found in the parsed XML files
+class TagSetAnalyzer:
+    needs = 'tags'
+
+    def __init__(self):
+        self.tags = set()
+
+    def consume(self, doc):
+        if doc.tags is not None:
+            self.tags.update(doc.tags)
+
+    def result(self):
+        return self.tags
+
+# Basic counts about the drop, including the files that failed to parse
+class StatsAnalyzer:
+    needs = None
+
+    def __init__(self):
+        self.stats = {'files': 0, 'xml_files': 0, 'bytes': 0, 'elements': 0, 'parse_errors': 0}
+        self.errors = []
+
+    def consume(self, doc):
+        self.stats['files'] += 1
+        self.stats['bytes'] += len(doc.data)
+        if doc.is_xml():
+            self.stats['xml_files'] += 1
+        if doc.error is not None:
+            self.stats['parse_errors'] += 1
+            self.errors.append((doc.path, doc.error))
+        else:
+            self.stats['elements'] += doc.element_count
+
+    def result(self):
+        return self.stats
+
+class IngestPipeline:
+    # source is either a ZIP file or a directory of XML files.
+    # extract_to is only used for ZIP sources, members are written there by the writer stage
+    # (members are only streamed, not written, if it is None).
+    # checkpoint is an optional ScanCheckpoint used to resume an interrupted run.
+    def __init__(self, source, extract_to=None, analyzers=(), workers=4, queue_size=32, checkpoint=None):
+        self.source = source
+        self.checkpoint = checkpoint
+        self.extract_to = extract_to
+        self.analyzers = list(analyzers)
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        needs = {analyzer.needs for analyzer in self.analyzers}
+        if 'tree' in needs:
+            self.backend = get_backend('tree')
+        elif 'tags' in needs:
+            self.backend = get_backend('tags')
+        else:
+            self.backend = None
+        self.stats = {name: StageStats(name) for name in ('reader', 'parser', 'analyzer', 'writer')}
+        self.elapsed = 0.0
+        self.failure = None
+        self.failed_stage = None
+        self.skipped = 0
+
+    def is_zip(self):
+        return self.source.lower().endswith('.zip')
+
+    # Runs every stage until the source is exhausted.
+    # Re-raises the first exception hit by any stage once everything has stopped.
+    # A checkpoint is saved on the way out if the run did not complete (Ctrl-C included).
+    def run(self):
+        start_time = time.time()
+        self.stop_event = threading.Event()
+        self._parsers_done = 0
+        self.skipped = 0
+        if self.checkpoint is not None:
+            self.checkpoint.load(self.analyzers)
+            # Written before anything is read: a crash before the first timed save still leaves a checkpoint,
+            # a half extracted folder is never taken for a complete one
+            self.checkpoint.save(self.analyzers)
+        parse_queue = queue.Queue(self.queue_size)
+        analyze_queue = queue.Queue(self.queue_size)
+        write_queue = queue.Queue(self.queue_size)
+
+        threads = [threading.Thread(target=self._guard, args=(self._read, parse_queue), daemon=True)]
+        threads += [threading.Thread(target=self._guard, args=(self._parse, parse_queue, analyze_queue), daemon=True)
+                    for _ in range(self.workers)]
+        threads.append(threading.Thread(target=self._guard, args=(self._analyze, analyze_queue, write_queue), daemon=True))
+        threads.append(threading.Thread(target=self._guard, args=(self._write, write_queue), daemon=True))
+
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            # Stages stop between two documents, so the analyzers match the files marked done
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+            self._save_checkpoint()
+            raise
+
+        self.elapsed = time.time() - start_time
+        if self.failure is not None:
+            # An analyzer that failed may be half way through a document, its state is not saved
+            if self.failed_stage != '_analyze':
+                self._save_checkpoint()
+            raise self.failure
+        if self.checkpoint is not None:
+            self.checkpoint.finish()
+        return self
+
+    def _save_checkpoint(self):
+        if self.checkpoint is not None and self.checkpoint.done:
+            self.checkpoint.save(self.analyzers)
+
+    # Keeps a failing stage from leaving the other ones blocked on a full or empty queue
+    def _guard(self, target, *queues):
+        try:
+            target(*queues)
+        except BaseException as e:
+            if self.failure is None:
+                self.failure = e
+                self.failed_stage = target.__name__
+            self.stop_event.set()
+
+    def _put(self, out_queue, item):
+        while not self.stop_event.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, in_queue):
+        while not self.stop_event.is_set():
+            try:
+                return in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    # True if a previous run already analyzed this member/file (and wrote it, for ZIP sources)
+    def _already_done(self, name, member_path=None, size=None):
+        if self.checkpoint is None or not self.checkpoint.is_done(name):
+            return False
+        if member_path is None:
+            return True
+        return os.path.isfile(member_path) and os.path.getsize(member_path) == size
+
+    # Stage 1: reads each member (or file) exactly once
+    def _read(self, parse_queue):
+        stats = self.stats['reader']
+        if self.is_zip():
+            with zipfile.ZipFile(self.source, 'r') as zip_ref:
+                for member in zip_ref.infolist():
+                    if member.is_dir():
+                        continue
+                    if self.extract_to is not None:
+                        member_path = member_target_path(self.extract_to, member.filename)
+                        if self._already_done(member.filename, member_path, member.file_size):
+                            self.skipped += 1
+                            continue
+                    else:
+                        member_path = member.filename
+                        if self._already_done(member.filename):
+                            self.skipped += 1
+                            continue
+                    started = time.perf_counter()
+                    data = zip_ref.read(member)
+                    stats.record(len(data), time.perf_counter() - started)
+                    doc = Document(member.filename, member_path, data)
+                    # Analyzed before the interruption but never written: only the writer needs it
+                    doc.done = self.checkpoint is not None and self.checkpoint.is_done(member.filename)
+                    if not self._put(parse_queue, doc):
+                        return
+        else:
+            for filename in sorted(os.listdir(self.source)):
+                file_path = os.path.join(self.source, filename)
+                # Only the XML files of a folder (not its index, checkpoint or ZIP files)
+                if not filename.lower().endswith('.xml') or not os.path.isfile(file_path):
+                    continue
+                if self._already_done(filename):
+                    self.skipped += 1
+                    continue
+                started = time.perf_counter()
+                with open(file_path, 'rb') as f:
+                    data = f.read()
+                stats.record(len(data), time.perf_counter() - started)
+                if not self._put(parse_queue, Document(filename, file_path, data)):
+                    return
+        for _ in range(self.workers):
+            self._put(parse_queue, _DONE)
+
+    # Stage 2: parses XML members, the last worker to finish closes the stream
+    def _parse(self, parse_queue, analyze_queue):
+        stats = self.stats['parser']
+        while True:
+            doc = self._get(parse_queue)
+            if doc is _DONE:
+                break
+            if self.backend is not None and doc.is_xml() and not doc.done:
+                started = time.perf_counter()
+                try:
+                    if self.backend.builds_tree:
+                        doc.root = self.backend.parse(doc.data)
+                        doc.tags = set()
+                        for elem in doc.root.iter():
+                            doc.tags.add(elem.tag)
+                            doc.element_count += 1
+                    else:
+                        scan = self.backend.scan(doc.data)
+                        doc.tags, doc.element_count = scan.tags, scan.element_count
+                except ET.ParseError as e:
+                    doc.error = str(e)
+                stats.record(len(doc.data), time.perf_counter() - started)
+            if not self._put(analyze_queue, doc):
+                return
+        with stats.lock:
+            self._parsers_done += 1
+            last = self._parsers_done == self.workers
+        if last:
+            self._put(analyze_queue, _DONE)
+
+    # Stage 3: hands each document to every analyzer, then drops the tree
+    def _analyze(self, analyze_queue, write_queue):
+        stats = self.stats['analyzer']
+        while True:
+            doc = self._get(analyze_queue)
+            if doc is _DONE:
+                break
+            if not doc.done:
+                started = time.perf_counter()
+                for analyzer in self.analyzers:
+                    analyzer.consume(doc)
+                doc.root = None
+                if self.checkpoint is not None:
+                    self.checkpoint.mark_done(doc.name, self.analyzers)
+                stats.record(len(doc.data), time.perf_counter() - started)
+            if not self._put(write_queue, doc):
+                return
+        self._put(write_queue, _DONE)
+
+    # Stage 4: writes ZIP members to disk, nothing to do for directory sources
+    def _write(self, write_queue):
+        stats = self.stats['writer']
+        while True:
+            doc = self._get(write_queue)
+            if doc is _DONE:
+                break
+            if self.is_zip() and self.extract_to is not None:
+                started = time.perf_counter()
+                os.makedirs(os.path.dirname(doc.path), exist_ok=True)
+                with open(doc.path, 'wb') as f:
+                    f.write(doc.data)
+                stats.record(len(doc.data), time.perf_counter() - started)
+            doc.data = None
+
+    # Per-stage throughput, the stage with the most busy time is the bottleneck
+    def report(self):
+        lines = [str(stats) for stats in self.stats.values()]
+        busiest = max(self.stats.values(), key=lambda stats: stats.busy)
+        lines.append(f"Bottleneck: {busiest.name} ({self.elapsed:.4f} seconds total)")
+        if self.skipped:
+            lines.append(f"Resumed from checkpoint: {self.skipped} file(s) already done were skipped")
+        return '\n'.join(lines)
+
+# Streams a ZIP (or directory) once and returns the analyzers' results in the same order
+def ingest(source, extract_to=None, analyzers=(), workers=4, queue_size=32, checkpoint=None):
+    pipeline = IngestPipeline(source, extract_to, analyzers, workers, queue_size, checkpoint).run()
+    return [analyzer.result() for analyzer in pipeline.analyzers], pipeline
@@ -0,0 +1,298 @@
+import xml.etree.ElementTree as ET
+import os
+import sys
+import pickle
+import shelve
+import tempfile
+import threading
+import tracemalloc
+import weakref
+from collections import OrderedDict
+
+'''
+
+Memory budget shared by the caches and indexes of one running instance.
+
+- Every cache charges the (estimated) size of what it keeps to the budget
+- When the budget is exceeded the least recently used entries are evicted,
+  and spilled to disk if the cache allows it (reloaded on the next access)
+- Large indexes can be moved to a shelve file on disk instead of a dict in memory,
+  only their sorted keys stay in memory (shared with the type-ahead)
+- With tracemalloc enabled, usage() also reports what Python really allocated
+
+'''
+
+# Rough size in bytes of an object and what it contains
+def estimate_size(obj, _seen=None):
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, ET.Element):
+        return sum(estimate_element_size(elem) for elem in obj.iter())
+    if isinstance(obj, ET.ElementTree):
+        return estimate_size(obj.getroot(), _seen)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(key, _seen) + estimate_size(value, _seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in obj)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        # Plain objects (the similarity and tag indexes) count what their attributes hold
+        size += estimate_size(vars(obj), _seen)
+    return size
+
+# Size of a single element without its children
+def estimate_element_size(elem):
+    size = sys.getsizeof(elem) + sys.getsizeof(elem.tag)
+    if elem.text:
+        size += sys.getsizeof(elem.text)
+    if elem.tail:
+        size += sys.getsizeof(elem.tail)
+    if elem.attrib:
+        size += sys.getsizeof(elem.attrib) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in elem.attrib.items())
+    return size
+
+class MemoryBudget:
+    def __init__(self, limit_bytes, use_tracemalloc=False):
+        self.limit_bytes = limit_bytes
+        self.charges = {}
+        self.consumers = []
+        self.lock = threading.RLock()
+        # Held by the thread evicting, the caches are never called with self.lock held
+        self.enforcing = threading.Lock()
+        self.use_tracemalloc = use_tracemalloc
+        self._spill_tmp = None
+        if use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @staticmethod
+    def from_megabytes(megabytes, use_tracemalloc=False):
+        return MemoryBudget(int(megabytes * 1024 * 1024), use_tracemalloc)
+
+    # Temporary directory for everything spilled to disk, removed with the budget
+    def spill_dir(self):
+        with self.lock:
+            if self._spill_tmp is None:
+                self._spill_tmp = tempfile.TemporaryDirectory(prefix="patent_spill_")
+            return self._spill_tmp.name
+
+    # Caches register themselves so the budget can ask them to shrink
+    def register(self, consumer):
+        with self.lock:
+            self.consumers.append(consumer)
+
+    def charge(self, name, n_bytes):
+        with self.lock:
+            self.charges[name] = self.charges.get(name, 0) + n_bytes
+
+    def release(self, name, n_bytes):
+        with self.lock:
+            self.charges[name] = max(0, self.charges.get(name, 0) - n_bytes)
+
+    def used(self):
+        with self.lock:
+            return sum(self.charges.values())
+
+    def over_budget(self):
+        return self.used() > self.limit_bytes
+
+    # Evicts from the registered caches (least recently used first) until usage fits the budget.
+    # Victims are chosen with the budget lock held, the caches evict (and spill) after it is released.
+    def enforce(self):
+        # Another thread is already evicting, it keeps going until usage fits
+        if not self.enforcing.acquire(blocking=False):
+            return
+        try:
+            while True:
+                with self.lock:
+                    excess = self.used() - self.limit_bytes
+                    consumers = list(self.consumers)
+                if excess <= 0:
+                    return
+                freed = 0
+                for consumer in consumers:
+                    freed += consumer.evict(excess - freed)
+                    if freed >= excess:
+                        break
+                if freed == 0:
+                    return
+        finally:
+            self.enforcing.release()
+
+    # Metric exposed to the application (bytes)
+    def usage(self):
+        with self.lock:
+            report = {'limit': self.limit_bytes, 'charged': self.used(), 'by_consumer': dict(self.charges)}
+        if self.use_tracemalloc and tracemalloc.is_tracing():
+            report['traced_current'], report['traced_peak'] = tracemalloc.get_traced_memory()
+        return report
+
+    def describe(self):
+        usage = self.usage()
+        text = f"Memory: {usage['charged'] / (1024 * 1024):.1f} / {usage['limit'] / (1024 * 1024):.0f} MB"
+        if 'traced_current' in usage:
+            text += f" (traced {usage['traced_current'] / (1024 * 1024):.1f} MB, peak {usage['traced_peak'] / (1024 * 1024):.1f} MB)"
+        return text
+
+# LRU cache charging its entries to a MemoryBudget.
+# Evicted entries are pickled to disk (if spill is True) and reloaded transparently by get().
+class BudgetedCache:
+    def __init__(self, budget, name, spill=False, size_function=estimate_size):
+        self.budget = budget
+        self.name = name
+        self.size_function = size_function
+        self.entries = OrderedDict()
+        self.spilled = {}
+        self.lock = threading.RLock()
+        self.spill = spill
+        self.spill_count = 0
+        budget.register(self)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries or key in self.spilled
+
+    # Keys in memory and on disk (a snapshot)
+    def keys(self):
+        with self.lock:
+            return list(self.entries) + list(self.spilled)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            spill_path = self.spilled.pop(key, None)
+        if spill_path is None:
+            return default
+        with open(spill_path, 'rb') as f:
+            value = pickle.load(f)
+        os.remove(spill_path)
+        self.put(key, value)
+        return value
+
+    # The budget is charged and enforced after the cache lock is released (enforce() takes the cache locks)
+    def put(self, key, value, size=None):
+        if size is None:
+            size = self.size_function(value)
+        with self.lock:
+            old_size, spill_path = self._pop(key)
+            self.entries[key] = (value, size)
+        self._forget(old_size, spill_path)
+        self.budget.charge(self.name, size)
+        self.budget.enforce()
+
+    def discard(self, key):
+        with self.lock:
+            old_size, spill_path = self._pop(key)
+        self._forget(old_size, spill_path)
+
+    # Removes a key from memory and disk records, returns (size in memory, spill file)
+    def _pop(self, key):
+        entry = self.entries.pop(key, None)
+        return (entry[1] if entry is not None else 0), self.spilled.pop(key, None)
+
+    def _forget(self, size, spill_path):
+        if size:
+            self.budget.release(self.name, size)
+        if spill_path is not None and os.path.exists(spill_path):
+            os.remove(spill_path)
+
+    # Removes least recently used entries until n_bytes are freed (or the cache is empty).
+    # Returns the number of bytes released from the budget.
+    def evict(self, n_bytes):
+        victims = []
+        freed = 0
+        with self.lock:
+            while self.entries and freed < n_bytes:
+                key, (value, size) = self.entries.popitem(last=False)
+                victims.append((key, value))
+                freed += size
+        if freed:
+            self.budget.release(self.name, freed)
+        if self.spill:
+            for key, value in victims:
+                self._spill(key, value)
+        return freed
+
+    # Pickled without the lock, not recorded if the key was put again in the meantime
+    def _spill(self, key, value):
+        spill_dir = self.budget.spill_dir()
+        with self.lock:
+            self.spill_count += 1
+            spill_path = os.path.join(spill_dir, f"{self.name}-{self.spill_count}.pkl")
+        with open(spill_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            stale = key in self.entries or key in self.spilled
+            if not stale:
+                self.spilled[key] = spill_path
+        if stale:
+            os.remove(spill_path)
+
+    def clear(self):
+        for key in self.keys():
+            self.discard(key)
+
+# Keeps a dict in memory while it fits its share of the budget, otherwise moves it to a shelve file.
+# Only supports what the indexes need: get, [], in, len, keys.
+# The sorted keys stay in memory either way (charged too), the type-ahead searches them without a copy.
+class SpillableIndex:
+    def __init__(self, budget, name, data, max_share=0.5):
+        self.budget = budget
+        self.name = name
+        self.keys_list = sorted(data)
+        # The key strings are shared with the dict, only the list itself adds to its size
+        keys_size = sys.getsizeof(self.keys_list)
+        self.size = estimate_size(data) + keys_size
+        self.shelf = None
+        self.data = data
+        self.lock = threading.Lock()
+        if self.size > budget.limit_bytes * max_share:
+            self.shelf = shelve.open(os.path.join(budget.spill_dir(), name), flag='n')
+            self.shelf.update(data)
+            # Closed before the spill directory is removed at exit (finalizers run newest first)
+            self._close_shelf = weakref.finalize(self, self.shelf.close)
+            self.data = None
+            self.size = estimate_size(self.keys_list)
+        budget.charge(name, self.size)
+
+    def is_spilled(self):
+        return self.shelf is not None
+
+    def get(self, key, default=None):
+        if self.shelf is not None:
+            with self.lock:
+                return self.shelf.get(key, default)
+        return self.data.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.keys_list)
+
+    def __iter__(self):
+        return iter(self.keys_list)
+
+    def keys(self):
+        return list(self)
+
+    # The keys in sorted order, the list itself (do not modify)
+    def sorted_keys(self):
+        return self.keys_list
+
+    def close(self):
+        self.budget.release(self.name, self.size)
+        if self.shelf is not None:
+            with self.lock:
+                self._close_shelf()
@@ -0,0 +1,70 @@
+import os
+import time
+import pickle
+from IngestPipeline import TagSetAnalyzer, StatsAnalyzer, IndexAnalyzer
+from ScanEngine import ScanEngine
+import ExtractAllElements
+import ExtractPatentElements
+from PathQuery import TagIndexAnalyzer, write_tag_index
+
+'''
+
+Nightly scan: produces the outputs of ExtractAllElements.py AND ExtractPatentElements.py
+(same files, same content) while parsing the corpus only once.
+The patent number index used by the viewer (patent_file_index.pkl) and the tag index used by path
+queries (patent_tag_index.pkl) are built in the same pass.
+An interrupted run resumes from NightlyScan.checkpoint (see ScanCheckpoint.py).
+
+'''
+
+def setup_paths():
+    data_dir = 'C:/Users/haddadm1/Desktop/Random Things/dd_Patent_Element_Testing'
+    patents_path = os.path.join(data_dir, 'Patents.txt')
+    sample_zip_path = os.path.join(data_dir, 'Sample.zip')
+    sample_dir = os.path.join(data_dir, 'Sample')
+    return data_dir, patents_path, sample_zip_path, sample_dir
+
+# Only written if the folder has no index yet, so a viewer index is never replaced mid-session
+def write_index(sample_dir, index):
+    index_file_path = os.path.join(sample_dir, 'patent_file_index.pkl')
+    if not os.path.exists(index_file_path):
+        with open(index_file_path, 'wb') as f:
+            pickle.dump(index, f)
+
+# Executes functions in sequential order
+def main():
+    start_time = time.time()
+
+    data_dir, patents_path, sample_zip_path, sample_dir = setup_paths()
+    checkpoint_path = os.path.join(data_dir, 'NightlyScan.checkpoint')
+    source = ExtractPatentElements.select_source(sample_zip_path, sample_dir, checkpoint_path)
+    ExtractPatentElements.check_for_nested_directory(sample_dir)
+    variations_map = ExtractPatentElements.create_variations_map(patents_path)
+
+    scan_engine = ScanEngine()
+    scan_engine.register('all_tags', TagSetAnalyzer())
+    scan_engine.register('patent_elements', ExtractPatentElements.VocabularyAnalyzer(variations_map))
+    stats_analyzer = scan_engine.register('stats', StatsAnalyzer())
+    scan_engine.register('index', IndexAnalyzer())
+    scan_engine.register('tag_index', TagIndexAnalyzer())
+    # Resumes from the last checkpoint if a previous run was interrupted
+    results = scan_engine.run(source, sample_dir, checkpoint_path)
+    ExtractPatentElements.check_for_nested_directory(sample_dir)
+
+    for file_path, error in stats_analyzer.errors:
+        print(f"Error parsing {file_path}: {error}")
+    ExtractAllElements.write_master_list(data_dir, results['all_tags'])
+    ExtractPatentElements.write_master_list(data_dir, results['patent_elements'])
+    # Paths are only final once the nested folder check has run
+    index = {number: os.path.join(sample_dir, os.path.basename(path)) for number, path in results['index'].items()}
+    write_index(sample_dir, index)
+    results['tag_index'].relocate(lambda path: os.path.join(sample_dir, os.path.basename(path)))
+    write_tag_index(sample_dir, results['tag_index'])
+    print(results['stats'])
+    print(scan_engine.report())
+
+    end_time = time.time()
+    print(f"The script took {end_time - start_time:.4f} seconds to complete.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,621 @@
+import xml.etree.ElementTree as ET
+import os
+import re
+import zipfile
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from IngestPipeline import ingest, IndexAnalyzer
+from ScanCheckpoint import ScanCheckpoint
+from SimilaritySearch import SimilarityIndex, SimilarityAnalyzer
+from TypeAhead import PatentNumberIndex
+from MemoryBudget import MemoryBudget, BudgetedCache, SpillableIndex, estimate_size
+from XmlBackends import get_backend
+from SubtreeStore import STORE_SCHEME, parse_store_path
+from RawGrep import RawGrep
+from PathQuery import compile_query, run_query, write_tag_index, TagIndex, TagIndexAnalyzer, TAG_INDEX_FILE_NAME
+
+'''
+
+UI-independent, thread-safe core of the patent viewer (used to live in UserExperience(2.1).py).
+
+- Never shows dialogs: failures are returned as Result objects and reported to listeners as Events
+- Every side (left, right, ...) has its own state, swapped in one step once it is fully loaded
+- Directories can be loaded at the same time from several threads (set_directory_async),
+  the heavy indexing of each one runs in its own process so both sides really load in parallel
+- The same directory is never indexed twice at the same time
+- Index builds are checkpointed in the directory, a build interrupted by a crash resumes on the next load
+- With a SubtreeStore attached, 'store:<patent>@<version>' paths open archived versions like files
+- Element content can be streamed in chunks (stream_element_content) so a viewer can render it progressively
+- Files of a side can be searched as raw bytes, without parsing (grep_directory, see RawGrep.py)
+- Element lookups are compiled path queries (PathQuery.py), query_directory() runs one on a whole side
+  and only opens the files whose tags could match
+- With a DocumentCache, parsed files are also kept on disk in a binary form read without parsing: element
+  lists and plain element lookups of files opened in an earlier session are served without parsing
+- Content rendered ahead of time (render_element_content, see Prefetch.py) is kept in a budgeted cache
+
+'''
+
+DEFAULT_MEMORY_BUDGET_MB = 512
+INDEX_FILE_NAME = 'patent_file_index.pkl'
+SIMILARITY_FILE_NAME = 'patent_similarity_index.pkl'
+CHECKPOINT_FILE_NAME = 'patent_index.checkpoint'
+
+# Outcome of an engine call: value when ok, error message otherwise
+class Result:
+    __slots__ = ('ok', 'value', 'error')
+
+    def __init__(self, ok, value=None, error=None):
+        self.ok = ok
+        self.value = value
+        self.error = error
+
+    @staticmethod
+    def success(value=None):
+        return Result(True, value)
+
+    @staticmethod
+    def failure(error, value=None):
+        return Result(False, value, error)
+
+    def __bool__(self):
+        return self.ok
+
+# Something worth telling the user about ('info' or 'error'), sent to every listener
+class Event:
+    __slots__ = ('kind', 'side', 'message')
+
+    def __init__(self, kind, side, message):
+        self.kind = kind
+        self.side = side
+        self.message = message
+
+# Everything loaded for one side, replaced as a whole when the side changes directory
+class SideState:
+    __slots__ = ('directory', 'index', 'similarity_index', 'number_index', 'tag_index', 'charges')
+
+    def __init__(self, directory, index, similarity_index, number_index, tag_index=None):
+        self.directory = directory
+        self.index = index
+        self.similarity_index = similarity_index
+        self.number_index = number_index
+        self.tag_index = tag_index
+        # (name, bytes) charged to the memory budget for the indexes of this side
+        self.charges = []
+
+# Same escaping as minidom's writer
+def _escape(data):
+    return data.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+# Prefix of every namespace of a subtree, chosen like ElementTree's writer
+# (registered prefixes such as xml, then ns0, ns1, ... in document order)
+def _namespace_prefixes(elem):
+    registered = ET.register_namespace._namespace_map
+    prefixes = {}
+    for node in elem.iter():
+        for name in [node.tag, *node.keys()]:
+            if name.startswith('{'):
+                uri = name[1:].partition('}')[0]
+                if uri not in prefixes:
+                    declared = sum(1 for prefix in prefixes.values() if prefix != 'xml')
+                    prefixes[uri] = registered.get(uri) or f"ns{declared}"
+    return prefixes
+
+# {uri}local -> prefix:local
+def _qualified_name(name, prefixes):
+    if not name.startswith('{'):
+        return name
+    uri, _, local = name[1:].partition('}')
+    return f"{prefixes[uri]}:{local}"
+
+# Pretty-prints an element piece by piece with the same layout as minidom's toprettyxml(indent="  "),
+# without building the whole string (or a DOM copy) first.
+# Namespaces are written with prefixes, declared on the first element (like ET.tostring).
+def iter_pretty_xml(elem, indent='', addindent='  ', prefixes=None):
+    declarations = []
+    if prefixes is None:
+        prefixes = _namespace_prefixes(elem)
+        declarations = sorted((prefix, uri) for uri, prefix in prefixes.items() if prefix != 'xml')
+    tag = _qualified_name(elem.tag, prefixes)
+    yield indent + '<' + tag
+    for prefix, uri in declarations:
+        yield f' xmlns:{prefix}="{_escape(uri)}"'
+    for name, value in elem.items():
+        yield f' {_qualified_name(name, prefixes)}="{_escape(value)}"'
+    children = list(elem)
+    if not children and not elem.text:
+        yield '/>\n'
+        return
+    yield '>'
+    if not children:
+        yield _escape(elem.text)
+    else:
+        yield '\n'
+        child_indent = indent + addindent
+        if elem.text:
+            yield _escape(child_indent + elem.text + '\n')
+        for child in children:
+            yield from iter_pretty_xml(child, child_indent, addindent, prefixes)
+            if child.tail:
+                yield _escape(child_indent + child.tail + '\n')
+        yield indent
+    yield f'</{tag}>\n'
+
+# Formatted text of one element (what the viewer shows), its tail is left out
+def iter_formatted_element(elem):
+    yield from iter_pretty_xml(elem)
+    yield '\n\n'
+
+# Builds the missing index files of a directory (or extracts a ZIP first).
+# Module level so it can run in a worker process, returns (index, similarity_index, tag_index).
+def build_directory_indexes(source, directory, build_index=True, build_similarity=True, build_tags=True):
+    analyzers = []
+    if build_index:
+        analyzers.append(IndexAnalyzer())
+    if build_similarity:
+        analyzers.append(SimilarityAnalyzer())
+    if build_tags:
+        analyzers.append(TagIndexAnalyzer())
+    if not analyzers:
+        return None, None, None
+
+    extract_to = directory if source != directory else None
+    if extract_to is not None:
+        # Raises BadZipFile before the folder exists, an empty folder would be indexed as is next time
+        zipfile.ZipFile(source).close()
+    os.makedirs(directory, exist_ok=True)
+    checkpoint = ScanCheckpoint(os.path.join(directory, CHECKPOINT_FILE_NAME), source)
+    results, _ = ingest(source, extract_to, analyzers, checkpoint=checkpoint)
+    results = iter(results)
+    index = next(results) if build_index else None
+    similarity_index = next(results) if build_similarity else None
+    tag_index = next(results) if build_tags else None
+    if index is not None:
+        with open(os.path.join(directory, INDEX_FILE_NAME), 'wb') as f:
+            pickle.dump(index, f)
+    if similarity_index is not None:
+        similarity_index.save(os.path.join(directory, SIMILARITY_FILE_NAME))
+    if tag_index is not None:
+        write_tag_index(directory, tag_index)
+    return index, similarity_index, tag_index
+
+class ExtractorEngine:
+    # use_processes=False keeps the indexing in the calling thread (handy for scripts and debugging)
+    # document_cache is an optional DocumentCache (parsed files on disk, kept across sessions)
+    def __init__(self, memory_budget=None, use_processes=True, workers=2, document_cache=None):
+        self.memory_budget = memory_budget or MemoryBudget.from_megabytes(DEFAULT_MEMORY_BUDGET_MB)
+        self.tree_cache = BudgetedCache(self.memory_budget, 'trees', spill=True)
+        self.element_lists = BudgetedCache(self.memory_budget, 'element_lists')
+        self.rendered = BudgetedCache(self.memory_budget, 'rendered')
+        # Full ElementTree trees: they are cached (pickled when spilled) and pretty-printed (see iter_pretty_xml)
+        self.xml_backend = get_backend('tree')
+
+        self.sides = {}
+        self.listeners = []
+        self.lock = threading.RLock()
+        self.directory_locks = {}
+        self.use_processes = use_processes
+        self.workers = workers
+        self.load_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='engine-load')
+        self.build_executor = None
+        # Kept between raw searches, started on the first one
+        self.grep_executor = None
+        self.index_generation = 0
+        self.store = None
+        self.document_cache = document_cache
+        # Parsed files are encoded into the document cache by this thread, never by the caller
+        self.cache_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='engine-cache')
+        self.caching = set()
+
+    def add_listener(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+
+    # Listeners are called from whatever thread produced the event
+    def emit(self, kind, side, message):
+        with self.lock:
+            listeners = list(self.listeners)
+        event = Event(kind, side, message)
+        for listener in listeners:
+            listener(event)
+
+    def _directory_lock(self, directory):
+        with self.lock:
+            return self.directory_locks.setdefault(os.path.abspath(directory), threading.Lock())
+
+    # executor replaces the engine's build pool (eg: the watcher's, so drops never delay the viewer's loads)
+    def _build(self, source, directory, build_index, build_similarity, build_tags, executor=None):
+        if not self.use_processes:
+            return build_directory_indexes(source, directory, build_index, build_similarity, build_tags)
+        with self.lock:
+            if executor is None:
+                if self.build_executor is None:
+                    self.build_executor = ProcessPoolExecutor(max_workers=self.workers)
+                executor = self.build_executor
+        return executor.submit(build_directory_indexes, source, directory, build_index, build_similarity,
+                               build_tags).result()
+
+    # Sets the directory for a side and extracts/indexes it if necessary.
+    # If the directory is a ZIP file, it is extracted next to it (same name without .zip).
+    # rebuild=True extracts and indexes a ZIP again even if its folder exists (the ZIP was replaced),
+    # build_executor is passed to _build().
+    def set_directory(self, directory, side, rebuild=False, build_executor=None):
+        source = directory
+        if directory.endswith('.zip'):
+            directory = directory[:-4] # for cases with .zip
+        rebuild = rebuild and source != directory
+
+        with self._directory_lock(directory):
+            checkpoint_path = os.path.join(directory, CHECKPOINT_FILE_NAME)
+            if rebuild and os.path.exists(checkpoint_path):
+                # Left by the previous ZIP, its files must not be skipped
+                os.remove(checkpoint_path)
+            # A ZIP whose extraction was interrupted is resumed instead of indexing the partial folder
+            checkpoint_source = ScanCheckpoint.pending_source(checkpoint_path)
+            resume_zip = source != directory and checkpoint_source == os.path.abspath(source)
+            if source != directory and (not os.path.exists(directory) or resume_zip or rebuild):
+                # Streams the ZIP once: members are written and indexed in the same pass
+                try:
+                    self._build(source, directory, True, True, True, build_executor)
+                except zipfile.BadZipFile:
+                    message = f"Invalid ZIP file for {side}."
+                    self.emit('error', side, message)
+                    return Result.failure(message)
+                self.emit('info', side, f"Extracted ZIP file for {side}.")
+
+            if not os.path.isdir(directory):
+                message = f"Invalid directory path for {side}."
+                self.emit('error', side, message)
+                return Result.failure(message)
+
+            if rebuild:
+                # Trees and content of the previous files are stale, every side showing the folder is reloaded
+                self._forget_directory(directory)
+                with self.lock:
+                    reloaded = [name for name, state in self.sides.items() if state.directory == directory and name != side]
+                for name in reloaded:
+                    self.preprocess_files(directory, name)
+                return self.preprocess_files(directory, side)
+
+            current = self.sides.get(side)
+            if current is not None and current.directory == directory:
+                return Result.success(directory)
+
+            return self.preprocess_files(directory, side)
+
+    # Drops the cached trees, element lists and content of the files of a folder
+    def _forget_directory(self, directory):
+        prefix = os.path.join(directory, '')
+        for cache in (self.tree_cache, self.element_lists, self.rendered):
+            for key in cache.keys():
+                file_path = key[0] if isinstance(key, tuple) else key
+                if file_path.startswith(prefix):
+                    cache.discard(key)
+
+    # Runs set_directory in the background, callback(result) is called from the worker thread
+    def set_directory_async(self, directory, side, callback=None):
+        future = self.load_executor.submit(self.set_directory, directory, side)
+        if callback is not None:
+            future.add_done_callback(lambda done: callback(self._future_result(done, side)))
+        return future
+
+    def _future_result(self, future, side):
+        try:
+            return future.result()
+        except Exception as e:
+            message = f"Failed to load directory for {side}: {e}"
+            self.emit('error', side, message)
+            return Result.failure(message)
+
+    # Processes files in the directory and indexes them by patent number.
+    # Only indexes if the index files do not exist yet.
+    # The similarity and tag indexes are built in the same pass (or alone for folders indexed by older versions).
+    # A missing tag index alone does not trigger a build, query_directory() builds it when first needed.
+    def preprocess_files(self, directory, side):
+        index_file_path = os.path.join(directory, INDEX_FILE_NAME)
+        similarity_file_path = os.path.join(directory, SIMILARITY_FILE_NAME)
+        tag_index_file_path = os.path.join(directory, TAG_INDEX_FILE_NAME)
+
+        index = None
+        similarity_index = None
+        if os.path.exists(index_file_path):
+            with open(index_file_path, 'rb') as f:
+                index = pickle.load(f)
+            self.emit('info', side, f"Files preprocessed for {side}. READY TO USE.")
+        if os.path.exists(similarity_file_path):
+            similarity_index = SimilarityIndex.load(similarity_file_path)
+        tag_index = TagIndex.load(tag_index_file_path) if os.path.exists(tag_index_file_path) else None
+
+        if index is None or similarity_index is None:
+            built_index, built_similarity, built_tags = self._build(directory, directory, index is None,
+                                                                    similarity_index is None, tag_index is None)
+            index = index if index is not None else built_index
+            similarity_index = similarity_index if similarity_index is not None else built_similarity
+            tag_index = tag_index if tag_index is not None else built_tags
+
+        # The index goes to disk (shelve) if it does not fit in half of the memory budget
+        with self.lock:
+            self.index_generation += 1
+            index_name = f"index_{side}_{self.index_generation}"
+        spillable_index = SpillableIndex(self.memory_budget, index_name, index)
+        # The type-ahead searches the sorted keys of the index, no second copy of every number
+        number_index = PatentNumberIndex(spillable_index.sorted_keys(), presorted=True)
+        state = SideState(directory, spillable_index, similarity_index, number_index, tag_index)
+        self._charge_side(state, f"similarity_{side}_{self.index_generation}", similarity_index)
+        self._charge_side(state, f"tags_{side}_{self.index_generation}", tag_index)
+        with self.lock:
+            previous = self.sides.get(side)
+            self.sides[side] = state
+        if previous is not None:
+            self._release_side(previous)
+        return Result.success(directory)
+
+    # Charges an index kept for a side to the memory budget (released with the side)
+    def _charge_side(self, state, name, index):
+        if index is None:
+            return
+        size = estimate_size(index)
+        self.memory_budget.charge(name, size)
+        state.charges.append((name, size))
+
+    def _release_side(self, state):
+        state.index.close()
+        for name, size in state.charges:
+            self.memory_budget.release(name, size)
+        state.charges = []
+
+    def directory(self, side):
+        state = self.sides.get(side)
+        return state.directory if state is not None else None
+
+    def find_xml_file_for_patent(self, patent_number, side):
+        state = self.sides.get(side)
+        return state.index.get(patent_number.lstrip('0')) if state is not None else None
+
+    # Patent numbers to suggest while the user is typing (prefix matches, then close typos).
+    def suggest_patent_numbers(self, text, side, limit=10):
+        state = self.sides.get(side)
+        if state is None:
+            return []
+        return state.number_index.suggest(text, limit)
+
+    # Returns the top_n patents closest to the given one as (patent number, score) pairs.
+    def find_similar_patents(self, patent_number, side, top_n=10):
+        state = self.sides.get(side)
+        if state is None or state.similarity_index is None:
+            return []
+        return state.similarity_index.most_similar(patent_number, top_n)
+
+    # Raw byte search of every file of a side, no parsing (see RawGrep.py).
+    # Returns a Result with at most max_results GrepMatch objects, in file order.
+    def grep_directory(self, side, element=None, pattern=None, ignore_case=False, max_results=1000):
+        state = self.sides.get(side)
+        if state is None:
+            return Result.failure(f"No directory loaded for {side}.")
+        try:
+            # Small chunks: the search usually stops at max_results, long before the end of the corpus
+            grep = RawGrep(element, pattern, ignore_case, workers=1, files_per_task=16, executor=self._grep_executor())
+            matches = []
+            found = grep.search(self._side_files(state))
+            try:
+                for match in found:
+                    matches.append(match)
+                    if len(matches) >= max_results:
+                        break
+            finally:
+                # Cancels the chunks not searched yet
+                found.close()
+        except (ValueError, OSError, re.error) as e:
+            return Result.failure(f"Search failed: {e}")
+        return Result.success(matches)
+
+    # XML files indexed for a side, in file order (a ZIP keeps its members in a subfolder, listdir would miss them)
+    def _side_files(self, state):
+        if state.tag_index is not None:
+            return sorted(state.tag_index.files)
+        return sorted(set(state.index.get(patent_number) for patent_number in state.index))
+
+    # Process pool of the raw searches, None when use_processes is False
+    def _grep_executor(self):
+        if not self.use_processes:
+            return None
+        with self.lock:
+            if self.grep_executor is None:
+                self.grep_executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.grep_executor
+
+    # Runs a path query (see PathQuery.py) on every file of a side that could match.
+    # Returns a Result with at most max_results QueryMatch objects, trees come from the engine cache.
+    def query_directory(self, side, query, namespaces=None, max_results=1000):
+        state = self.sides.get(side)
+        if state is None:
+            return Result.failure(f"No directory loaded for {side}.")
+        try:
+            compiled = compile_query(query, namespaces)
+        except ValueError as e:
+            return Result.failure(str(e))
+        if state.tag_index is None:
+            with self._directory_lock(state.directory):
+                if state.tag_index is None:
+                    tag_index = self._build(state.directory, state.directory, False, False, True)[2]
+                    with self.lock:
+                        generation = self.index_generation
+                    self._charge_side(state, f"tags_{side}_{generation}", tag_index)
+                    state.tag_index = tag_index
+        # Unreadable files are skipped and reported to the listeners
+        on_error = lambda file_path, e: self.emit('error', side, f"Error parsing {os.path.basename(file_path)}: {e}")
+        matches = []
+        for match in run_query(compiled, tag_index=state.tag_index, parse=self.get_root, on_error=on_error):
+            matches.append(match)
+            if len(matches) >= max_results:
+                break
+        return Result.success(matches)
+
+    # Current memory accounting (bytes), see MemoryBudget.usage().
+    def memory_usage(self):
+        return self.memory_budget.usage()
+
+    # Lets archived versions be opened through store paths (see SubtreeStore.store_path).
+    # The objects the store decodes are charged to the engine's memory budget.
+    def attach_store(self, store):
+        store.use_budget(self.memory_budget)
+        self.store = store
+
+    # Parsed root of a file (or of an archived version), kept in the budgeted cache
+    # (evicted trees are spilled to disk).
+    # Raises ET.ParseError, OSError or KeyError, callers turn them into a Result.
+    def get_root(self, file_path):
+        root = self.tree_cache.get(file_path)
+        if root is None:
+            if file_path.startswith(STORE_SCHEME):
+                if self.store is None:
+                    raise KeyError(file_path)
+                root = self.store.get_root(*parse_store_path(file_path))
+            else:
+                root = self.xml_backend.parse(file_path)
+                self._cache_document_async(file_path, root)
+            self.tree_cache.put(file_path, root)
+        return root
+
+    # Cached form of a file from the document cache, None if it is not there (or there is no cache)
+    def _compact_document(self, file_path):
+        if self.document_cache is None or file_path.startswith(STORE_SCHEME):
+            return None
+        try:
+            return self.document_cache.get(file_path)
+        except OSError:
+            return None
+
+    # Encodes a parsed file into the document cache in the background (once, however often it is parsed)
+    def _cache_document_async(self, file_path, root):
+        if self.document_cache is None:
+            return
+        with self.lock:
+            if file_path in self.caching:
+                return
+            self.caching.add(file_path)
+        self.cache_executor.submit(self._cache_document, file_path, root)
+
+    def _cache_document(self, file_path, root):
+        try:
+            self.document_cache.put(file_path, root)
+        except OSError:
+            # The cache is only a shortcut, a full disk must not break the viewer
+            pass
+        finally:
+            with self.lock:
+                self.caching.discard(file_path)
+
+    # Prases the entire XML tree.
+    # Lists all UNIQUE elements in the given XML file.
+    def list_all_elements(self, file_path):
+        cached = self.element_lists.get(file_path)
+        if cached is not None:
+            return Result.success(cached)
+
+        elements = set()
+        compact = self._compact_document(file_path)
+        if compact is not None:
+            # Tag table of the cached document, nothing to parse
+            elements.update(compact.element_tags())
+            compact.close()
+        else:
+            try:
+                root = self.get_root(file_path)
+                for elem in root.iter():
+                    elements.add(elem.tag)
+            except (ET.ParseError, OSError, KeyError):
+                return Result.failure(f"Failed to parse XML in {file_path}", [])
+
+        elements = sorted(elements)
+        self.element_lists.put(file_path, elements)
+        return Result.success(elements)
+
+    # Retrieves and formats the content of a specific XML element and its children.
+    def get_element_content(self, file_path, element_name):
+        result = self.stream_element_content(file_path, element_name)
+        if not result.ok:
+            return Result.failure(result.error, '')
+        content = []
+        try:
+            for chunk in result.value:
+                content.append(chunk)
+        except Exception as e:
+            return Result.failure(str(e), ''.join(content))
+
+        return Result.success(''.join(content))
+
+    # Formats the content of an element now and keeps it for the next click (used by the prefetcher).
+    def render_element_content(self, file_path, element_name):
+        if (file_path, element_name) in self.rendered:
+            return Result.success(self.rendered.get((file_path, element_name)))
+        result = self.get_element_content(file_path, element_name)
+        if result.ok:
+            self.rendered.put((file_path, element_name), result.value)
+        return result
+
+    # Same content as get_element_content, as a generator of chunks of about chunk_chars characters.
+    # The file is parsed right away (a parse failure is a failed Result), formatting happens lazily.
+    # A plain tag whose file is in the document cache (and not already parsed) is read from the cache,
+    # when rebuilding its elements is cheaper than parsing the file.
+    def stream_element_content(self, file_path, element_name, chunk_chars=4096):
+        content = self.rendered.get((file_path, element_name))
+        if content is not None:
+            return Result.success(content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars))
+        try:
+            # Compiled once per element name (a bare name is a descendant query, same as './/' + name)
+            query = compile_query(element_name)
+        except ValueError as e:
+            return Result.failure(str(e))
+        if query.tag is not None and file_path not in self.tree_cache:
+            compact = self._compact_document(file_path)
+            if compact is not None:
+                indexes = compact.find(query.tag)
+                if compact.cheaper_than_parsing(indexes):
+                    return Result.success(self._chunk_elements(self._compact_elements(compact, query.tag, indexes), chunk_chars))
+                compact.close()
+        try:
+            root = self.get_root(file_path)
+        except (ET.ParseError, OSError, KeyError):
+            return Result.failure(f"Failed to parse XML in {file_path}")
+        return Result.success(self._chunk_elements(query.iterfind(root), chunk_chars))
+
+    # Elements rebuilt from a cached document, the map is closed once they are all out
+    def _compact_elements(self, compact, tag, indexes=None):
+        try:
+            yield from compact.iter_descendants(tag, indexes)
+        finally:
+            compact.close()
+
+    # Chunks of about chunk_chars characters, a longer piece (eg: a long text) is cut
+    def _chunk_elements(self, elements, chunk_chars):
+        buffer = []
+        buffered = 0
+        for elem in elements:
+            for piece in iter_formatted_element(elem):
+                if len(piece) > chunk_chars:
+                    if buffer:
+                        yield ''.join(buffer)
+                        buffer = []
+                        buffered = 0
+                    # The rest (1 to chunk_chars characters) goes to the buffer
+                    last = len(piece) - (len(piece) % chunk_chars or chunk_chars)
+                    for start in range(0, last, chunk_chars):
+                        yield piece[start:start + chunk_chars]
+                    piece = piece[last:]
+                buffer.append(piece)
+                buffered += len(piece)
+                if buffered >= chunk_chars:
+                    yield ''.join(buffer)
+                    buffer = []
+                    buffered = 0
+        if buffer:
+            yield ''.join(buffer)
+
+    def shutdown(self):
+        self.load_executor.shutdown(wait=False, cancel_futures=True)
+        self.cache_executor.shutdown(wait=False, cancel_futures=True)
+        if self.build_executor is not None:
+            self.build_executor.shutdown(wait=False, cancel_futures=True)
+        if self.grep_executor is not None:
+            self.grep_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,340 @@
+import xml.etree.ElementTree as ET
+import os
+import re
+import sys
+import time
+import pickle
+from functools import lru_cache
+from IngestPipeline import ingest, patent_number_from_filename, local_name
+from XmlBackends import get_backend
+
+'''
+
+Small path query language over the patent documents, compiled once and run on one file or a corpus.
+
+    ClaimText                         every ClaimText element, anywhere (same as //ClaimText)
+    //claims/claim                    claim elements directly under claims
+    /ca-patent-document//date         absolute path from the root element
+    //claim[@num='0001']//b           attribute predicate, descendant step
+    //classification-ipcr[@sequence]  attribute must exist
+    //addressbook[name='ACME']        child text predicate, [1] / [last()] positions work as well
+    //pat:ClaimText                   namespace prefix, resolved with the namespaces map
+    //*:ClaimText                     local name in any namespace (or none)
+    //{http://www.wipo.int/standards/XMLSchema/ST96/Patent}ClaimText
+
+- Queries are translated to ElementTree paths and compiled ONCE (lru_cache), the GUI, the engine
+  and the scripts share the same compiled objects
+- Each query knows the local tag names a file must contain to possibly match: with a TagIndex
+  (built during the scans, see TagIndexAnalyzer) only those files are opened
+- run_query() is a generator, matches are returned while the corpus is being read
+
+'''
+
+TAG_INDEX_FILE_NAME = 'patent_tag_index.pkl'
+
+# [@attribute], [@attribute='value'], [@attribute!='value'], [tag], [tag='text'], [tag!='text']
+_PREDICATE = re.compile(r"""^\s*(@?)([^\s=!'"]+)\s*(?:(!?=)\s*('[^']*'|"[^"]*"))?\s*$""")
+# [1], [last()], [last()-1]
+_POSITION = re.compile(r"^\s*(\d+|last\(\)(\s*-\s*\d+)?)\s*$")
+
+class CompiledQuery:
+    __slots__ = ('text', 'path', 'absolute', 'required', 'tag')
+
+    def __init__(self, text, path, absolute, required, tag=None):
+        self.text = text
+        self.path = path
+        self.absolute = absolute
+        # Local names a document must contain for the query to match
+        self.required = required
+        # Exact tag when the query is a plain tag lookup (same as './/' + tag), None otherwise
+        self.tag = tag
+
+    def __repr__(self):
+        return f"CompiledQuery({self.text!r} -> {self.path!r})"
+
+    def iterfind(self, root):
+        if self.absolute:
+            # The first step has to match the root element itself: search from a parent made up for it
+            wrapper = ET.Element('query-root')
+            wrapper.append(root)
+            return wrapper.iterfind(self.path)
+        return root.iterfind(self.path)
+
+    def findall(self, root):
+        return list(self.iterfind(root))
+
+    # True if a document holding these local tag names could match
+    def could_match(self, local_names):
+        return self.required.issubset(local_names)
+
+# Turns a step name into ElementTree syntax, adds its local name to required
+def _translate_name(name, namespaces, required, attribute=False):
+    if name in ('*', '.', '..'):
+        return name
+    if name.startswith('{'):
+        uri, _, local = name[1:].partition('}')
+        if not local:
+            raise ValueError(f"Invalid name: {name}")
+        translated = name
+    elif ':' in name:
+        prefix, _, local = name.partition(':')
+        if prefix == '*':
+            translated = '{*}' + local
+        elif prefix in namespaces:
+            translated = '{' + namespaces[prefix] + '}' + local
+        else:
+            raise ValueError(f"Unknown namespace prefix: {prefix}")
+    else:
+        local = name
+        translated = name
+    if not attribute and local != '*':
+        required.add(local)
+    return translated
+
+def _translate_predicate(predicate, namespaces, required):
+    if _POSITION.match(predicate):
+        return '[' + predicate.strip() + ']'
+    match = _PREDICATE.match(predicate)
+    if match is None:
+        raise ValueError(f"Unsupported predicate: [{predicate}]")
+    at, name, operator, value = match.groups()
+    translated = at + _translate_name(name, namespaces, required, attribute=bool(at))
+    if operator:
+        translated += operator + value
+    return '[' + translated + ']'
+
+# Splits a query into (axis, name, [predicates]) steps, axis is '/' or '//'
+def _split_steps(text):
+    steps = []
+    position = 0
+    axis = '//'
+    if text.startswith('//'):
+        position = 2
+    elif text.startswith('/'):
+        axis = '/'
+        position = 1
+    while True:
+        start = position
+        if text.startswith('{', position):
+            position = text.find('}', position)
+            if position == -1:
+                raise ValueError(f"Unclosed namespace in query: {text}")
+        while position < len(text) and text[position] not in '/[':
+            position += 1
+        name = text[start:position].strip()
+        if not name:
+            raise ValueError(f"Empty step in query: {text}")
+        predicates = []
+        while text.startswith('[', position):
+            end = position + 1
+            quote = None
+            while end < len(text) and (quote or text[end] != ']'):
+                if text[end] in '\'"':
+                    quote = None if quote == text[end] else (quote or text[end])
+                end += 1
+            if end >= len(text):
+                raise ValueError(f"Unclosed predicate in query: {text}")
+            predicates.append(text[position + 1:end])
+            position = end + 1
+        steps.append((axis, name, predicates))
+        if position >= len(text):
+            return steps
+        if text.startswith('//', position):
+            axis = '//'
+            position += 2
+        elif text.startswith('/', position):
+            axis = '/'
+            position += 1
+        else:
+            raise ValueError(f"Unexpected character in query: {text[position:]}")
+
+@lru_cache(maxsize=512)
+def _compile(text, namespace_items):
+    namespaces = dict(namespace_items)
+    steps = _split_steps(text.strip())
+    required = set()
+    absolute = steps[0][0] == '/'
+    parts = []
+    for axis, name, predicates in steps:
+        step = _translate_name(name, namespaces, required)
+        step += ''.join(_translate_predicate(predicate, namespaces, required) for predicate in predicates)
+        parts.append(axis + step)
+    path = '.' + ''.join(parts)
+    try:
+        # ElementTree checks the syntax (and caches its own compiled form)
+        ET.Element('query-root').findall(path)
+    except SyntaxError as e:
+        raise ValueError(f"Invalid query {text}: {e}") from None
+    axis, name, predicates = steps[0]
+    tag = None
+    if len(steps) == 1 and axis == '//' and not predicates and parts[0] == '//' + name and '*' not in name and name not in ('.', '..'):
+        tag = name
+    return CompiledQuery(text, path, absolute, frozenset(required), tag)
+
+# Compiled form of a query, the same object is returned for the same text and namespaces.
+# Raises ValueError for a query that cannot be compiled.
+def compile_query(text, namespaces=None):
+    return _compile(text, tuple(sorted((namespaces or {}).items())))
+
+# Local tag names of every file of a corpus, as an inverted index (local name -> file numbers)
+class TagIndex:
+    def __init__(self):
+        self.files = []
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.files)
+
+    def add(self, file_path, tags):
+        number = len(self.files)
+        self.files.append(file_path)
+        for name in {local_name(tag) for tag in tags}:
+            self.postings.setdefault(sys.intern(name), set()).add(number)
+
+    # Files that contain every required local name, in the order they were added
+    def candidates(self, required):
+        if not required:
+            return list(self.files)
+        postings = sorted((self.postings.get(name, set()) for name in required), key=len)
+        numbers = set(postings[0]).intersection(*postings[1:])
+        return [self.files[number] for number in sorted(numbers)]
+
+    # Rewrites the stored paths (eg: once the files of a ZIP were moved out of a nested folder)
+    def relocate(self, new_path):
+        self.files = [new_path(file_path) for file_path in self.files]
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+# IngestPipeline / ScanEngine analyzer filling a TagIndex from the tag-only scan
+class TagIndexAnalyzer:
+    needs = 'tags'
+
+    def __init__(self):
+        self.tag_index = TagIndex()
+
+    def consume(self, doc):
+        if doc.tags is not None:
+            self.tag_index.add(doc.path, doc.tags)
+
+    def result(self):
+        return self.tag_index
+
+# IngestPipeline / ScanEngine analyzer running a compiled query on every parsed document.
+# result() is {file path: number of matches} for the files that matched.
+class QueryAnalyzer:
+    needs = 'tree'
+
+    def __init__(self, query, namespaces=None):
+        self.query = compile_query(query, namespaces)
+        # Namespaces resolved, a checkpoint of another query is not resumed (see ScanCheckpoint)
+        self.checkpoint_key = self.query.path
+        self.counts = {}
+
+    # The compiled query is not saved in checkpoints, the one compiled for this run is kept
+    def __getstate__(self):
+        return {'counts': self.counts}
+
+    def consume(self, doc):
+        if doc.root is None or not self.query.could_match({local_name(tag) for tag in doc.tags}):
+            return
+        count = sum(1 for _ in self.query.iterfind(doc.root))
+        if count:
+            self.counts[doc.path] = count
+
+    def result(self):
+        return self.counts
+
+# Saves the tag index of a folder (paths as given, see TagIndex.relocate)
+def write_tag_index(directory, tag_index):
+    tag_index_path = os.path.join(directory, TAG_INDEX_FILE_NAME)
+    temporary_path = tag_index_path + '.tmp'
+    tag_index.save(temporary_path)
+    os.replace(temporary_path, tag_index_path)
+
+# Prints the number of matches of each query analyzer of a scan
+def print_query_counts(queries, results):
+    for query in queries:
+        counts = results[query]
+        print(f"{query}: {sum(counts.values())} match(es) in {len(counts)} file(s)")
+
+# One element found by a query
+class QueryMatch:
+    __slots__ = ('patent_number', 'file_path', 'element')
+
+    def __init__(self, patent_number, file_path, element):
+        self.patent_number = patent_number
+        self.file_path = file_path
+        self.element = element
+
+# Runs a query (text or compiled) on files and yields a QueryMatch for every element found.
+# With a tag_index, only the files that could match are opened (file_paths then narrows them down).
+# parse(file_path) returns the root element, the engine passes its cached parse.
+# A file that cannot be read is skipped, on_error(file_path, error) is called for it.
+def run_query(query, file_paths=None, tag_index=None, parse=None, namespaces=None, on_error=None):
+    compiled = query if isinstance(query, CompiledQuery) else compile_query(query, namespaces)
+    parse = parse or get_backend('tree').parse
+    if tag_index is not None:
+        candidates = tag_index.candidates(compiled.required)
+        if file_paths is not None:
+            wanted = set(file_paths)
+            candidates = [file_path for file_path in candidates if file_path in wanted]
+    else:
+        candidates = list(file_paths or [])
+    for file_path in candidates:
+        try:
+            root = parse(file_path)
+        except (ET.ParseError, OSError, KeyError) as e:
+            if on_error is not None:
+                on_error(file_path, e)
+            continue
+        patent_number = patent_number_from_filename(os.path.basename(file_path))
+        for elem in compiled.iterfind(root):
+            yield QueryMatch(patent_number, file_path, elem)
+
+# Tag index of a folder, loaded from TAG_INDEX_FILE_NAME or built (and saved) with a tag-only scan
+def load_tag_index(directory):
+    tag_index_path = os.path.join(directory, TAG_INDEX_FILE_NAME)
+    if os.path.exists(tag_index_path):
+        return TagIndex.load(tag_index_path)
+    results, _ = ingest(directory, analyzers=[TagIndexAnalyzer()])
+    write_tag_index(directory, results[0])
+    return results[0]
+
+def setup_paths():
+    data_dir = 'C:/Users/haddadm1/Desktop/Random Things/dd_Patent_Element_Testing'
+    sample_dir = os.path.join(data_dir, 'Sample')
+    return data_dir, sample_dir
+
+# Usage: PathQuery.py "<query>" [folder]
+def main():
+    start_time = time.time()
+    data_dir, sample_dir = setup_paths()
+    if len(sys.argv) < 2:
+        print('Usage: PathQuery.py "<query>" [folder]')
+        return
+    if len(sys.argv) > 2:
+        sample_dir = sys.argv[2]
+
+    compiled = compile_query(sys.argv[1])
+    tag_index = load_tag_index(sample_dir)
+    candidates = tag_index.candidates(compiled.required)
+    count = 0
+    on_error = lambda file_path, e: print(f"Error parsing {file_path}: {e}")
+    for match in run_query(compiled, tag_index=tag_index, on_error=on_error):
+        text = ' '.join(' '.join(match.element.itertext()).split())
+        print(f"{match.patent_number}\t{local_name(match.element.tag)}\t{text[:100]}")
+        count += 1
+    print(f"{count} match(es), {len(candidates)} of {len(tag_index)} file(s) opened")
+
+    end_time = time.time()
+    print(f"The script took {end_time - start_time:.4f} seconds to complete.")
+
+if __name__ == "__main__":
+    main()
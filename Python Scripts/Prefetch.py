@@ -0,0 +1,127 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from IngestPipeline import local_name
+
+'''
+
+Speculative prefetch for comparison work.
+
+- When a patent is opened on one side, the same number is resolved and parsed on the other sides
+  (the side it was opened on is parsed by the viewer itself, never twice at the same time)
+- The most clicked elements (Abstract and Claims to begin with) are rendered ahead of time on every side,
+  on the opened side once the viewer has displayed its element list
+- When an element is clicked on one side, the same element is rendered for the patent open on the others
+- At most max_workers tasks run at once and at most max_pending wait, the oldest waiting ones are dropped
+- Opening another patent on a side cancels what was queued for the previous one
+- Results land in the engine caches (trees, element lists, rendered content), so the next click is a cache hit
+
+'''
+
+# Local names rendered ahead of time before any click has been counted
+DEFAULT_ELEMENTS = ('abstract', 'claims')
+
+class Prefetcher:
+    def __init__(self, engine, max_workers=2, max_pending=16, top_elements=3):
+        self.engine = engine
+        self.max_pending = max_pending
+        self.top_elements = top_elements
+        self.clicks = Counter()
+        self.lock = threading.Lock()
+        self.pending = []
+        # Bumped for a side when it opens another patent, older tasks for that side then stop early
+        self.generations = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+
+    def record_click(self, element):
+        with self.lock:
+            self.clicks[local_name(element).lower()] += 1
+
+    # Local names worth rendering ahead of time, most clicked first
+    def likely_elements(self):
+        with self.lock:
+            ranked = [name for name, _ in self.clicks.most_common(self.top_elements)]
+        for name in DEFAULT_ELEMENTS:
+            if name not in ranked and len(ranked) < self.top_elements:
+                ranked.append(name)
+        return ranked
+
+    def _submit(self, side, task, *args):
+        with self.lock:
+            generation = self.generations.get(side, 0)
+            self.pending = [(s, future) for s, future in self.pending if not future.done()]
+            while len(self.pending) >= self.max_pending:
+                _, oldest = self.pending.pop(0)
+                oldest.cancel()
+            future = self.executor.submit(self._run, side, generation, task, *args)
+            self.pending.append((side, future))
+        return future
+
+    def _run(self, side, generation, task, *args):
+        if self.is_stale(side, generation):
+            return None
+        try:
+            return task(side, generation, *args)
+        except Exception:
+            # Prefetch is best effort, the real click reports the error
+            return None
+
+    def is_stale(self, side, generation):
+        with self.lock:
+            return self.generations.get(side, 0) != generation
+
+    # Cancels what is queued for a side and makes its running tasks stop at their next step
+    def cancel(self, side):
+        with self.lock:
+            self.generations[side] = self.generations.get(side, 0) + 1
+            keep = []
+            for pending_side, future in self.pending:
+                if pending_side == side:
+                    future.cancel()
+                else:
+                    keep.append((pending_side, future))
+            self.pending = keep
+
+    # A patent was opened on one side: warm the same number everywhere else, and its likely elements.
+    # The opened side itself is left to the viewer until on_patent_displayed().
+    def on_patent_opened(self, patent_number, side, other_sides):
+        self.cancel(side)
+        for target_side in other_sides:
+            if target_side != side:
+                self.cancel(target_side)
+                self._submit(target_side, self._warm_patent, patent_number)
+
+    # The viewer listed the elements of the patent opened on a side (its parse is cached): render the likely ones
+    def on_patent_displayed(self, file_path, side):
+        self._submit(side, self._warm_likely_elements, file_path)
+
+    # An element was clicked on one side: render it for the patents open on the other sides
+    def on_element_clicked(self, element, side, open_files):
+        self.record_click(element)
+        for other_side, file_path in open_files.items():
+            if other_side != side and file_path:
+                self._submit(other_side, self._warm_element, file_path, element)
+
+    def _warm_patent(self, side, generation, patent_number):
+        file_path = self.engine.find_xml_file_for_patent(patent_number, side)
+        if file_path is None or self.is_stale(side, generation):
+            return None
+        return self._warm_likely_elements(side, generation, file_path)
+
+    def _warm_likely_elements(self, side, generation, file_path):
+        elements = self.engine.list_all_elements(file_path).value
+        wanted = set(self.likely_elements())
+        for element in elements:
+            if self.is_stale(side, generation):
+                return None
+            if local_name(element).lower() in wanted:
+                self.engine.render_element_content(file_path, element)
+        return file_path
+
+    def _warm_element(self, side, generation, file_path, element):
+        if element in self.engine.list_all_elements(file_path).value:
+            self.engine.render_element_content(file_path, element)
+        return file_path
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,224 @@
+import os
+import re
+import sys
+import mmap
+import time
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from IngestPipeline import patent_number_from_filename
+
+'''
+
+Raw byte grep over the XML files of a folder, for quick triage without parsing anything
+("which files mention this applicant", "which files have a <ClaimText> at all").
+
+- Every file is memory-mapped and searched with a compiled bytes regex, no tree, no decoding
+- The search can be scoped to an element: only the bytes between <Element ...> and </Element>
+  are searched, whatever its namespace prefix (<pat:ClaimText> and <ClaimText> both match)
+- Without a pattern, every occurrence of the element is reported
+- Files are cut into chunks searched by worker processes, matches come back in file order
+  as soon as their chunk is done, chunks not started yet are cancelled when the caller stops early
+- Each match gives the patent number, the byte offset in the file and a short snippet
+
+It is a raw scan: comments, CDATA and entities are not interpreted, and an element nested inside
+another one of the same name ends the scope at the first closing tag.
+
+'''
+
+# Whitespace runs in snippets are shown as a single space
+_WHITESPACE = re.compile(rb'\s+')
+
+class GrepMatch:
+    __slots__ = ('patent_number', 'file_path', 'offset', 'snippet')
+
+    def __init__(self, patent_number, file_path, offset, snippet):
+        self.patent_number = patent_number
+        self.file_path = file_path
+        self.offset = offset
+        self.snippet = snippet
+
+    def __repr__(self):
+        return f"GrepMatch({self.patent_number!r}, {os.path.basename(self.file_path)!r}, {self.offset}, {self.snippet!r})"
+
+# Compiled once per process for each (pattern, ignore_case)
+@lru_cache(maxsize=128)
+def compile_pattern(pattern, ignore_case=False):
+    if pattern is None:
+        return None
+    if isinstance(pattern, str):
+        pattern = pattern.encode('utf-8')
+    return re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+
+# Opening and closing tags of an element, with any namespace prefix
+@lru_cache(maxsize=128)
+def compile_element(element):
+    if element is None:
+        return None
+    name = re.escape(element.encode('utf-8'))
+    open_tag = re.compile(rb'<(?:[\w.-]{1,64}:)?' + name + rb'(?=[\s/>])')
+    close_tag = re.compile(rb'</(?:[\w.-]{1,64}:)?' + name + rb'\s*>')
+    return open_tag, close_tag
+
+# Byte ranges (start, end) of the content of every occurrence of the element
+def element_regions(data, element_tags):
+    open_tag, close_tag = element_tags
+    position = 0
+    while True:
+        opening = open_tag.search(data, position)
+        if opening is None:
+            return
+        tag_end = data.find(b'>', opening.end())
+        if tag_end == -1:
+            return
+        content_start = tag_end + 1
+        if data[tag_end - 1:tag_end] == b'/':
+            yield opening.start(), content_start, content_start
+            position = content_start
+            continue
+        closing = close_tag.search(data, content_start)
+        content_end = closing.start() if closing is not None else len(data)
+        yield opening.start(), content_start, content_end
+        position = closing.end() if closing is not None else len(data)
+
+def make_snippet(data, start, end, low, high, context):
+    snippet = data[max(low, start - context):min(high, end + context)]
+    return _WHITESPACE.sub(b' ', snippet).strip().decode('utf-8', 'replace')
+
+# Matches of one file, in offset order.
+# max_matches stops the file early (1 is enough to know that a file matches).
+def grep_file(file_path, element=None, pattern=None, ignore_case=False, context=60, max_matches=None):
+    regex = compile_pattern(pattern, ignore_case)
+    element_tags = compile_element(element)
+    patent_number = patent_number_from_filename(os.path.basename(file_path))
+    matches = []
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return matches
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if element_tags is None:
+                regions = [(0, 0, len(data))]
+            else:
+                regions = element_regions(data, element_tags)
+            for tag_start, start, end in regions:
+                if regex is None:
+                    # No pattern: the element itself is the match
+                    matches.append(GrepMatch(patent_number, file_path, tag_start,
+                                             make_snippet(data, start, start, start, end, context)))
+                else:
+                    for found in regex.finditer(data, start, end):
+                        matches.append(GrepMatch(patent_number, file_path, found.start(),
+                                                 make_snippet(data, found.start(), found.end(), start, end, context)))
+                        if max_matches is not None and len(matches) >= max_matches:
+                            return matches
+                if max_matches is not None and len(matches) >= max_matches:
+                    return matches
+    return matches
+
+# Worker: greps a chunk of files (runs in a separate process)
+def grep_chunk(task):
+    file_paths, element, pattern, ignore_case, context, max_matches = task
+    results = []
+    for file_path in file_paths:
+        try:
+            results.extend(grep_file(file_path, element, pattern, ignore_case, context, max_matches))
+        except OSError as e:
+            print(f"Error reading {file_path}: {e}")
+    return results
+
+class RawGrep:
+    # workers=1 searches in the calling process (no pool).
+    # executor is an optional ProcessPoolExecutor kept by the caller between searches (workers is then ignored).
+    def __init__(self, element=None, pattern=None, ignore_case=False, context=60,
+                 max_matches_per_file=None, workers=None, files_per_task=64, executor=None):
+        if element is None and pattern is None:
+            raise ValueError("An element, a pattern or both are required")
+        self.element = element
+        self.pattern = pattern
+        self.ignore_case = ignore_case
+        self.context = context
+        self.max_matches_per_file = max_matches_per_file
+        self.workers = workers or os.cpu_count()
+        self.files_per_task = files_per_task
+        self.executor = executor
+        self.files = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        # Fails here, not in a worker, if the pattern is not a valid regex
+        compile_pattern(pattern, ignore_case)
+
+    @staticmethod
+    def list_xml_files(directory):
+        return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith('.xml'))
+
+    # Yields the matches of every file, in file order, while the search goes on.
+    # Closing the generator early (eg: enough matches) cancels the chunks still queued.
+    def search(self, file_paths):
+        start_time = time.perf_counter()
+        file_paths = list(file_paths)
+        self.files = len(file_paths)
+        self.bytes = sum(os.path.getsize(file_path) for file_path in file_paths)
+        tasks = [(file_paths[i:i + self.files_per_task], self.element, self.pattern, self.ignore_case,
+                  self.context, self.max_matches_per_file)
+                 for i in range(0, len(file_paths), self.files_per_task)]
+        try:
+            if self.executor is None and (self.workers <= 1 or len(tasks) <= 1):
+                for task in tasks:
+                    yield from grep_chunk(task)
+            else:
+                executor = self.executor or ProcessPoolExecutor(max_workers=self.workers)
+                futures = [executor.submit(grep_chunk, task) for task in tasks]
+                try:
+                    for future in futures:
+                        yield from future.result()
+                finally:
+                    if self.executor is None:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                    else:
+                        for future in futures:
+                            future.cancel()
+        finally:
+            self.elapsed = time.perf_counter() - start_time
+
+    def search_directory(self, directory):
+        return self.search(self.list_xml_files(directory))
+
+    def throughput(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return (self.bytes / (1024 * 1024)) / self.elapsed
+
+def setup_paths():
+    data_dir = 'C:/Users/haddadm1/Desktop/Random Things/dd_Patent_Element_Testing'
+    sample_dir = os.path.join(data_dir, 'Sample')
+    return data_dir, sample_dir
+
+# Usage: RawGrep.py <element or -> [pattern or -] [folder]
+    # RawGrep.py ClaimText hydrogen     -> claims mentioning hydrogen
+    # RawGrep.py ClaimText              -> files having a ClaimText at all
+    # RawGrep.py - "Acme Corp"          -> anywhere in the file
+    # RawGrep.py ca-grantee - Sample2   -> files having a grantee, in another folder
+def main():
+    start_time = time.time()
+    data_dir, sample_dir = setup_paths()
+    if len(sys.argv) < 2:
+        print("Usage: RawGrep.py <element or -> [pattern or -] [folder]")
+        return
+    element = None if sys.argv[1] == '-' else sys.argv[1]
+    pattern = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != '-' else None
+    if len(sys.argv) > 3:
+        sample_dir = sys.argv[3]
+
+    grep = RawGrep(element, pattern, max_matches_per_file=1 if pattern is None else None)
+    count = 0
+    matching_files = set()
+    for match in grep.search_directory(sample_dir):
+        print(f"{match.patent_number}\t{match.offset}\t{match.snippet}")
+        count += 1
+        matching_files.add(match.file_path)
+    print(f"{count} match(es) in {len(matching_files)} of {grep.files} file(s), {grep.throughput():.2f} MB/s")
+
+    end_time = time.time()
+    print(f"The script took {end_time - start_time:.4f} seconds to complete.")
+
+if __name__ == "__main__":
+    main()
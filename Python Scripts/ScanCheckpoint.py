@@ -0,0 +1,104 @@
+import os
+import pickle
+import time
+
+'''
+
+Checkpoints for long corpus scans (IngestPipeline, ScanEngine, index builds of the viewer).
+
+- When the scan starts and then every every_seconds, the analyzers and the list of files already
+  analyzed are pickled to a single checkpoint file (on time only: the whole state is written each
+  time, the cost of a save grows with the scan)
+- The file is written next to its final name and then renamed, so a crash while saving leaves the
+  previous checkpoint intact
+- On the next run with the same source and the same analyzers, their state is restored and the
+  files already done are skipped, the final result is the same as an uninterrupted run
+- The checkpoint is deleted once the scan completes, a checkpoint of another source (or of other
+  analyzers) is ignored and replaced
+
+Analyzers are saved with pickle, an analyzer holding something that cannot be pickled (open files,
+callbacks, ...) can leave it out with __getstate__, only the saved attributes are restored.
+An analyzer whose result depends on its arguments (eg: the query of a QueryAnalyzer) sets
+checkpoint_key to them, a checkpoint made with other arguments is not resumed.
+
+'''
+
+CHECKPOINT_VERSION = 1
+
+class ScanCheckpoint:
+    def __init__(self, path, source, every_seconds=30.0):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.every_seconds = every_seconds
+        self.done = set()
+        self.resumed = 0
+        self.last_save = time.time()
+
+    # Source recorded in an existing checkpoint file, None if there is none (or it is unreadable).
+    # Lets a script resume from the ZIP it was extracting instead of the half written folder.
+    @staticmethod
+    def pending_source(path):
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f).get('source')
+        except Exception:
+            return None
+
+    def _signature(self, analyzers):
+        return [(type(analyzer).__name__, getattr(analyzer, 'checkpoint_key', None)) for analyzer in analyzers]
+
+    # Restores the analyzers from the checkpoint if it matches this scan.
+    # Returns the set of file names already done (empty when starting over).
+    def load(self, analyzers):
+        self.done = set()
+        self.resumed = 0
+        if not os.path.exists(self.path):
+            return self.done
+        try:
+            with open(self.path, 'rb') as f:
+                saved = pickle.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return self.done
+        if (saved.get('version') != CHECKPOINT_VERSION or saved.get('source') != self.source
+                or saved.get('analyzers') != self._signature(analyzers)):
+            return self.done
+        for analyzer, saved_analyzer in zip(analyzers, saved['state']):
+            analyzer.__dict__.update(saved_analyzer.__dict__)
+        self.done = set(saved['done'])
+        self.resumed = len(self.done)
+        return self.done
+
+    def is_done(self, name):
+        return name in self.done
+
+    # Called once a document went through every analyzer, saves when a checkpoint is due
+    def mark_done(self, name, analyzers):
+        self.done.add(name)
+        if time.time() - self.last_save >= self.every_seconds:
+            self.save(analyzers)
+
+    def save(self, analyzers):
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'source': self.source,
+            'analyzers': self._signature(analyzers),
+            'done': self.done,
+            'state': list(analyzers),
+        }
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self.last_save = time.time()
+
+    # The scan completed, the next one starts from scratch
+    def finish(self):
+        for path in (self.path, self.path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+        self.done = set()
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from IngestPipeline import IngestPipeline
+from ScanCheckpoint import ScanCheckpoint
+
+'''
+
+Single-pass scan engine shared by the extraction scripts.
+
+Analyzers are registered under a name, the corpus is then streamed and parsed ONCE
+(see IngestPipeline) and every analyzer sees every document:
+    - all tags union       (IngestPipeline.TagSetAnalyzer)
+    - ST.96 vocabulary     (ExtractPatentElements.VocabularyAnalyzer)
+    - statistics           (IngestPipeline.StatsAnalyzer)
+    - patent number index  (IngestPipeline.IndexAnalyzer)
+    - any plain callback   (on_document)
+
+The parser backend is picked from what the registered analyzers need, so a run with only
+tag based analyzers never builds a tree.
+
+With a checkpoint path, an interrupted run (crash, Ctrl-C) resumes where it stopped on the next
+call with the same source and analyzers (see ScanCheckpoint.py).
+
+'''
+
+# Wraps a plain function so it can be registered like an analyzer.
+# callback(doc) is called for every document, result() returns what the callback returned last.
+class CallbackAnalyzer:
+    def __init__(self, callback, needs='tags'):
+        self.callback = callback
+        self.needs = needs
+        self.last = None
+
+    # Callbacks are not saved in checkpoints, the registered one is kept on resume
+    def __getstate__(self):
+        return {'needs': self.needs, 'last': self.last}
+
+    def consume(self, doc):
+        self.last = self.callback(doc)
+
+    def result(self):
+        return self.last
+
+class ScanEngine:
+    def __init__(self, workers=4, queue_size=32):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.analyzers = OrderedDict()
+        self.pipeline = None
+
+    def register(self, name, analyzer):
+        if name in self.analyzers:
+            raise ValueError(f"An analyzer is already registered as {name}")
+        self.analyzers[name] = analyzer
+        return analyzer
+
+    def on_document(self, name, callback, needs='tags'):
+        return self.register(name, CallbackAnalyzer(callback, needs))
+
+    # Streams the source once and returns {analyzer name: result}.
+    # extract_to is only used for ZIP sources (see IngestPipeline).
+    # checkpoint_path turns on periodic checkpoints, the file is removed once the run completes.
+    def run(self, source, extract_to=None, checkpoint_path=None):
+        checkpoint = ScanCheckpoint(checkpoint_path, source) if checkpoint_path else None
+        self.pipeline = IngestPipeline(source, extract_to, list(self.analyzers.values()),
+                                       self.workers, self.queue_size, checkpoint).run()
+        return OrderedDict((name, analyzer.result()) for name, analyzer in self.analyzers.items())
+
+    def report(self):
+        return self.pipeline.report() if self.pipeline is not None else ''
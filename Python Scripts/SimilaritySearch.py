@@ -0,0 +1,171 @@
+import hashlib
+import random
+import re
+import pickle
+import heapq
+from array import array
+from IngestPipeline import patent_number_from_filename, local_name
+
+'''
+
+"Find similar patents" for an opened patent.
+
+- Each patent gets 2 MinHash signatures:
+    - its set of element tags
+    - word shingles of its abstract and claims text
+- Text signatures are cut into bands and stored in an LSH index while the drop is ingested
+  (SimilarityAnalyzer plugs into IngestPipeline)
+- A query only looks at patents sharing at least one text band bucket, never the whole corpus.
+  Tag sets only rank the candidates: the BFT documents share nearly the same schema, banding them
+  would make every patent a candidate
+- A patent without abstract or claims text has no text signature, it is similar to nothing
+
+'''
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Local (lowercase) names of the elements whose text is shingled
+TEXT_ELEMENTS = ('abstract', 'claims')
+
+# Returns a 32 bit hash of a shingle, stable between runs (unlike hash())
+def stable_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=4).digest(), 'little')
+
+# Word n-grams of the given text
+def text_shingles(text, size=3):
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+# Text of the abstract and claims of a parsed document
+def abstract_and_claims_text(root):
+    parts = []
+    for elem in root.iter():
+        if local_name(elem.tag).lower() in TEXT_ELEMENTS:
+            parts.append(' '.join(elem.itertext()))
+    return ' '.join(parts)
+
+class MinHash:
+    # The same seed must be used to build and to query an index
+    def __init__(self, num_perm=128, seed=1):
+        generator = random.Random(seed)
+        self.num_perm = num_perm
+        self.a = [generator.randrange(1, _MERSENNE_PRIME) for _ in range(num_perm)]
+        self.b = [generator.randrange(0, _MERSENNE_PRIME) for _ in range(num_perm)]
+
+    # None for an empty set (a constant signature would make every empty set identical)
+    def signature(self, shingles):
+        hashes = [stable_hash(shingle) for shingle in shingles]
+        if not hashes:
+            return None
+        return array('I', [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+                           for a, b in zip(self.a, self.b)])
+
+    # Estimated Jaccard similarity of the 2 sets behind the signatures
+    @staticmethod
+    def similarity(signature_a, signature_b):
+        return sum(1 for x, y in zip(signature_a, signature_b) if x == y) / len(signature_a)
+
+# Locality sensitive hashing over the bands of the signatures
+class LSHIndex:
+    def __init__(self, num_perm=128, bands=32):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [{} for _ in range(bands)]
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            start = band * self.rows
+            yield band, signature[start:start + self.rows].tobytes()
+
+    def add(self, key, signature):
+        for band, band_key in self._band_keys(signature):
+            self.buckets[band].setdefault(band_key, set()).add(key)
+
+    def remove(self, key, signature):
+        for band, band_key in self._band_keys(signature):
+            bucket = self.buckets[band].get(band_key)
+            if bucket and key in bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band][band_key]
+
+    def candidates(self, signature):
+        found = set()
+        for band, band_key in self._band_keys(signature):
+            found.update(self.buckets[band].get(band_key, ()))
+        return found
+
+class SimilarityIndex:
+    def __init__(self, num_perm=128, bands=32, seed=1, tag_weight=0.5):
+        self.minhash = MinHash(num_perm, seed)
+        self.tag_weight = tag_weight
+        self.tag_signatures = {}
+        self.text_signatures = {}
+        self.text_lsh = LSHIndex(num_perm, bands)
+
+    def __len__(self):
+        return len(self.tag_signatures)
+
+    # Adds (or replaces) a patent from its parsed XML root
+    def add_document(self, patent_number, root, tags=None):
+        if tags is None:
+            tags = {elem.tag for elem in root.iter()}
+        self.add(patent_number, tags, text_shingles(abstract_and_claims_text(root)))
+
+    def add(self, patent_number, tags, shingles):
+        if self.text_signatures.get(patent_number) is not None:
+            self.text_lsh.remove(patent_number, self.text_signatures[patent_number])
+        text_signature = self.minhash.signature(shingles)
+        self.tag_signatures[patent_number] = self.minhash.signature(tags)
+        self.text_signatures[patent_number] = text_signature
+        if text_signature is not None:
+            self.text_lsh.add(patent_number, text_signature)
+
+    # Top-N nearest neighbours of an indexed patent as (patent number, score), best first.
+    # Only the text LSH candidates are scored, a patent without text has no neighbour.
+    def most_similar(self, patent_number, top_n=10):
+        patent_number = patent_number.lstrip('0')
+        text_signature = self.text_signatures.get(patent_number)
+        if text_signature is None:
+            return []
+        tag_signature = self.tag_signatures[patent_number]
+        candidates = self.text_lsh.candidates(text_signature)
+        candidates.discard(patent_number)
+
+        scored = []
+        for candidate in candidates:
+            tag_score = MinHash.similarity(tag_signature, self.tag_signatures[candidate])
+            text_score = MinHash.similarity(text_signature, self.text_signatures[candidate])
+            score = self.tag_weight * tag_score + (1 - self.tag_weight) * text_score
+            scored.append((score, candidate))
+        return [(candidate, score) for score, candidate in heapq.nlargest(top_n, scored)]
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+# IngestPipeline analyzer filling a SimilarityIndex while the drop is streamed
+class SimilarityAnalyzer:
+    needs = 'tree'
+
+    def __init__(self, similarity_index=None):
+        self.similarity_index = similarity_index if similarity_index is not None else SimilarityIndex()
+
+    def consume(self, doc):
+        patent_number = patent_number_from_filename(doc.name)
+        if doc.root is not None and patent_number:
+            self.similarity_index.add_document(patent_number, doc.root, doc.tags)
+
+    def result(self):
+        return self.similarity_index
@@ -0,0 +1,280 @@
+import xml.etree.ElementTree as ET
+import os
+import sys
+import json
+import zlib
+import struct
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from IngestPipeline import ingest, patent_number_from_filename
+from MemoryBudget import BudgetedCache
+
+'''
+
+Content-addressed archive of patent documents across weekly drops.
+
+- Every document is split into subtrees, a subtree big enough (min_chunk_bytes) becomes an object
+  named by the SHA-1 of its canonical encoding, smaller ones stay inline in their parent
+- An object references its child objects by hash, so an unchanged abstract/claims/biblio subtree
+  republished next week is the same object and is stored only once
+- Objects are zlib-compressed and appended to a single pack file (objects.pack + objects.idx)
+- catalog.jsonl lists every (patent, version) with the hash of its root object
+- get_root() rebuilds an ElementTree element, which PatentEngine can use like a parsed file
+
+Layout of a store directory:
+    objects.pack   compressed objects, back to back
+    objects.idx    fixed size records: sha1 (20 bytes) + offset (8) + length (4)
+    catalog.jsonl  one JSON line per stored document version
+
+'''
+
+_INDEX_RECORD = struct.Struct('>20sQI')
+# Prefix of the pseudo file paths understood by PatentEngine (store:<patent>@<version>)
+STORE_SCHEME = 'store:'
+
+# Version label of a BFT file name (CA-BFT-0321670-20240325.xml -> 20240325)
+def version_from_filename(filename):
+    parts = os.path.splitext(os.path.basename(filename))[0].split('-')
+    if len(parts) > 3 and parts[3].isdigit():
+        return parts[3]
+    return None
+
+def store_path(patent_number, version):
+    return f"{STORE_SCHEME}{patent_number}@{version}"
+
+def parse_store_path(path):
+    patent_number, _, version = path[len(STORE_SCHEME):].partition('@')
+    return patent_number, version or None
+
+# Everything before the root element (XML declaration and DOCTYPE), kept as is
+def document_prolog(data):
+    start = 0
+    while True:
+        start = data.find(b'<', start)
+        if start == -1:
+            return b''
+        if data[start + 1:start + 2] not in (b'?', b'!'):
+            return data[:start]
+        start += 1
+
+class SubtreeStore:
+    def __init__(self, store_dir, min_chunk_bytes=512, compression_level=6, cache_size=4096):
+        self.store_dir = store_dir
+        self.min_chunk_bytes = min_chunk_bytes
+        self.compression_level = compression_level
+        self.lock = threading.RLock()
+        self.objects = {}
+        self.catalog = {}
+        self.decoded = OrderedDict()
+        self.cache_size = cache_size
+        # Set by use_budget, then decoded objects live there instead of in self.decoded
+        self.budgeted = None
+
+        os.makedirs(store_dir, exist_ok=True)
+        self.pack_path = os.path.join(store_dir, 'objects.pack')
+        self.index_path = os.path.join(store_dir, 'objects.idx')
+        self.catalog_path = os.path.join(store_dir, 'catalog.jsonl')
+        self._load()
+        self.pack_file = open(self.pack_path, 'a+b')
+        self.index_file = open(self.index_path, 'ab')
+        self.catalog_file = open(self.catalog_path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            # A record cut by a crash is ignored, its object will simply be written again
+            usable = len(data) - len(data) % _INDEX_RECORD.size
+            for digest, offset, length in _INDEX_RECORD.iter_unpack(data[:usable]):
+                self.objects[digest.hex()] = (offset, length)
+        if os.path.exists(self.catalog_path):
+            with open(self.catalog_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.catalog.setdefault(entry['patent'], {})[entry['version']] = entry
+
+    def close(self):
+        with self.lock:
+            for f in (self.pack_file, self.index_file, self.catalog_file):
+                f.close()
+
+    # Canonical form of an element whose big children are already stored (attributes keep document order).
+    # Returns (node, size of the subtree once serialized, roughly).
+    def _encode(self, elem):
+        children = []
+        size = len(elem.tag) + len(elem.text or '') + sum(len(k) + len(v) for k, v in elem.attrib.items())
+        for child in elem:
+            entry, child_size = self._store_subtree(child)
+            children.append([entry, child.tail])
+            size += child_size + len(child.tail or '')
+        node = [elem.tag, list(elem.attrib.items()), elem.text, children]
+        return node, size
+
+    # Stores elem (if big enough) and returns how its parent refers to it: a hash or the inline node
+    def _store_subtree(self, elem):
+        node, size = self._encode(elem)
+        if size < self.min_chunk_bytes:
+            return node, size
+        return self._put_object(node), size
+
+    def _put_object(self, node):
+        encoded = json.dumps(node, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha1(encoded).hexdigest()
+        with self.lock:
+            if digest not in self.objects:
+                compressed = zlib.compress(encoded, self.compression_level)
+                self.pack_file.seek(0, os.SEEK_END)
+                offset = self.pack_file.tell()
+                self.pack_file.write(compressed)
+                self.pack_file.flush()
+                self.index_file.write(_INDEX_RECORD.pack(bytes.fromhex(digest), offset, len(compressed)))
+                self.index_file.flush()
+                self.objects[digest] = (offset, len(compressed))
+        return digest
+
+    # Keeps the decoded objects in a cache charged to a MemoryBudget (evicted by size, not by count)
+    def use_budget(self, budget):
+        with self.lock:
+            self.budgeted = BudgetedCache(budget, 'subtrees')
+            self.decoded.clear()
+
+    def _get_object(self, digest):
+        budgeted = self.budgeted
+        if budgeted is not None:
+            node = budgeted.get(digest)
+            if node is not None:
+                return node
+        with self.lock:
+            node = self.decoded.get(digest)
+            if node is not None:
+                self.decoded.move_to_end(digest)
+                return node
+            offset, length = self.objects[digest]
+            self.pack_file.seek(offset)
+            compressed = self.pack_file.read(length)
+        node = json.loads(zlib.decompress(compressed))
+        if budgeted is not None:
+            budgeted.put(digest, node)
+            return node
+        with self.lock:
+            self.decoded[digest] = node
+            if len(self.decoded) > self.cache_size:
+                self.decoded.popitem(last=False)
+        return node
+
+    # Adds one parsed document, returns its root hash.
+    # Storing the same content again only adds a catalog line.
+    def add_root(self, patent_number, version, root, prolog=b'', source=None):
+        root_hash = self._put_object(self._encode(root)[0])
+        entry = {'patent': patent_number, 'version': version, 'root': root_hash,
+                 'prolog': prolog.decode('utf-8', 'replace'), 'file': source}
+        with self.lock:
+            if self.catalog.get(patent_number, {}).get(version, {}).get('root') == root_hash:
+                return root_hash
+            self.catalog.setdefault(patent_number, {})[version] = entry
+            self.catalog_file.write(json.dumps(entry) + '\n')
+            self.catalog_file.flush()
+        return root_hash
+
+    def add_file(self, file_path, version=None):
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        return self.add_bytes(os.path.basename(file_path), data, version)
+
+    def add_bytes(self, filename, data, version=None, root=None):
+        patent_number = patent_number_from_filename(filename)
+        version = version or version_from_filename(filename)
+        if root is None:
+            root = ET.fromstring(data)
+        return self.add_root(patent_number, version, root, document_prolog(data), filename)
+
+    # Archives a whole drop (ZIP or folder) in one streaming pass
+    def add_drop(self, source, version=None):
+        analyzer = SubtreeStoreAnalyzer(self, version)
+        # No extract folder: ZIP members are archived without being written out
+        ingest(source, analyzers=[analyzer])
+        return analyzer.result()
+
+    def versions(self, patent_number):
+        return sorted(self.catalog.get(patent_number.lstrip('0'), {}))
+
+    def patents(self):
+        return sorted(self.catalog)
+
+    # Rebuilds the document of a patent (latest version if none given)
+    def get_root(self, patent_number, version=None):
+        versions = self.catalog.get(patent_number.lstrip('0'))
+        if not versions:
+            raise KeyError(patent_number)
+        entry = versions[version] if version else versions[max(versions)]
+        return self._build(self._get_object(entry['root']))
+
+    def get_xml(self, patent_number, version=None):
+        versions = self.catalog[patent_number.lstrip('0')]
+        entry = versions[version] if version else versions[max(versions)]
+        root = self._build(self._get_object(entry['root']))
+        return entry['prolog'].encode('utf-8') + ET.tostring(root, encoding='utf-8', xml_declaration=False)
+
+    def _build(self, node):
+        tag, attributes, text, children = node
+        elem = ET.Element(tag, dict(attributes))
+        elem.text = text
+        for entry, tail in children:
+            child = self._build(self._get_object(entry) if isinstance(entry, str) else entry)
+            child.tail = tail
+            elem.append(child)
+        return elem
+
+    # Numbers to check that the store only grows with real changes
+    def stats(self):
+        with self.lock:
+            pack_bytes = os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0
+            return {
+                'patents': len(self.catalog),
+                'versions': sum(len(versions) for versions in self.catalog.values()),
+                'objects': len(self.objects),
+                'pack_bytes': pack_bytes,
+            }
+
+# IngestPipeline analyzer archiving every parsed document of a drop
+class SubtreeStoreAnalyzer:
+    needs = 'tree'
+
+    def __init__(self, store, version=None):
+        self.store = store
+        self.version = version
+        self.added = 0
+
+    def consume(self, doc):
+        if doc.root is not None and patent_number_from_filename(doc.name):
+            self.store.add_bytes(os.path.basename(doc.name), doc.data, self.version, doc.root)
+            self.added += 1
+
+    def result(self):
+        return self.added
+
+def setup_paths():
+    data_dir = 'C:/Users/haddadm1/Desktop/Random Things/dd_Patent_Element_Testing'
+    store_dir = os.path.join(data_dir, 'Archive')
+    return data_dir, store_dir
+
+# Archives the drops given on the command line (ZIP files or folders) and prints the store size
+def main():
+    start_time = time.time()
+    data_dir, store_dir = setup_paths()
+    store = SubtreeStore(store_dir)
+    for source in sys.argv[1:]:
+        added = store.add_drop(source)
+        print(f"{source}: {added} document(s) archived")
+    print(store.stats())
+    store.close()
+    end_time = time.time()
+    print(f"The script took {end_time - start_time:.4f} seconds to complete.")
+
+if __name__ == "__main__":
+    main()
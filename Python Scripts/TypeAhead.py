@@ -0,0 +1,85 @@
+import bisect
+
+'''
+
+Type-ahead suggestions over indexed patent numbers.
+
+- Prefix matches come from a sorted key array with bisect (no scan of the keys)
+- Typos are handled by generating every string within a small edit distance of the input
+  (deletions, substitutions, insertions and swaps over the digits actually used) and
+  looking each one up as a prefix, the cost depends on the input length, not on the index size
+
+'''
+
+class PatentNumberIndex:
+    # With presorted=True, patent_numbers is a sorted list of unique numbers and is used as is (not copied)
+    def __init__(self, patent_numbers=(), presorted=False):
+        self.keys = patent_numbers if presorted else sorted(set(patent_numbers))
+        self.alphabet = sorted({char for key in self.keys for char in key}) or list('0123456789')
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Patent numbers starting with prefix, in sorted order
+    def prefix_matches(self, prefix, limit=10):
+        start = bisect.bisect_left(self.keys, prefix)
+        matches = []
+        for key in self.keys[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            matches.append(key)
+        return matches
+
+    def has_prefix(self, prefix):
+        start = bisect.bisect_left(self.keys, prefix)
+        return start < len(self.keys) and self.keys[start].startswith(prefix)
+
+    # Every string one edit away from text (Damerau-Levenshtein)
+    def _edits(self, text):
+        splits = [(text[:i], text[i:]) for i in range(len(text) + 1)]
+        edits = set()
+        for left, right in splits:
+            if right:
+                edits.add(left + right[1:])
+                for char in self.alphabet:
+                    edits.add(left + char + right[1:])
+            if len(right) > 1:
+                edits.add(left + right[1] + right[0] + right[2:])
+            for char in self.alphabet:
+                edits.add(left + char + right)
+        edits.discard(text)
+        return edits
+
+    # Patent numbers starting with a string at most max_distance edits away from text.
+    # Returns (patent number, distance) pairs, closest first.
+    def fuzzy_matches(self, text, max_distance=1, limit=10):
+        found = {}
+        frontier = {text}
+        seen = {text}
+        for distance in range(1, max_distance + 1):
+            next_frontier = set()
+            for candidate in frontier:
+                for edit in self._edits(candidate):
+                    if edit in seen or not edit:
+                        continue
+                    seen.add(edit)
+                    next_frontier.add(edit)
+                    if self.has_prefix(edit):
+                        for key in self.prefix_matches(edit, limit):
+                            found.setdefault(key, distance)
+            frontier = next_frontier
+        return sorted(found.items(), key=lambda item: (item[1], len(item[0]), item[0]))[:limit]
+
+    # Suggestions for what has been typed so far: exact prefix matches first, then typo corrections
+    def suggest(self, text, limit=10, max_distance=1):
+        text = text.strip().lstrip('0')
+        if not text:
+            return []
+        suggestions = self.prefix_matches(text, limit)
+        if len(suggestions) < limit:
+            for key, _ in self.fuzzy_matches(text, max_distance, limit):
+                if key not in suggestions:
+                    suggestions.append(key)
+                if len(suggestions) == limit:
+                    break
+        return suggestions
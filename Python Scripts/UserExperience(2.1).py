@@ -17,116 +17,104 @@ but allows leading zero(s) in patent number input.
 
 - Creates a pkl file to store indexed files for faster (immediate) access
 
+- ZIP files are streamed through IngestPipeline (read, index and write in a single pass)
+
+- "Find Similar" lists the nearest patents of the opened one (MinHash + LSH index built at ingest time)
+
+- Type-ahead dropdown under the patent number entry (prefix + typo tolerant suggestions)
+
+- Parsed files and indexes respect a memory budget (LRU eviction, spill to disk), usage shown at the bottom
+
+- Extraction, indexing and parsing live in PatentEngine.py (no UI), both sides load at the same time
+
+- Element content is inserted chunk by chunk (after()), so big elements never freeze the window
+
+- Opening a patent prefetches the same number on the other side and its most clicked elements (Prefetch.py)
+
+- An index build interrupted by a crash resumes from its checkpoint the next time the folder is loaded
+
+- With WATCH_FOLDER set, new weekly drops are extracted and indexed in the background (WatchFolder.py)
+
+- The filter accepts path queries starting with '/' (eg: //claim[@num='0001']//b), see PathQuery.py
+
+- Parsed files are cached on disk in a binary form (DocumentCache.py), reopening a patent in a later
+  session lists and shows its elements without parsing the XML again (entries take about as much
+  disk space as the XML files)
+
 '''
 
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
-import os
-import zipfile
 import tkinter as tk
 from tkinter import messagebox, scrolledtext
-import pickle
+import queue
+import time
+import os
+from MemoryBudget import MemoryBudget
+from DocumentCache import DocumentCache
+from PatentEngine import ExtractorEngine, Event
+from Prefetch import Prefetcher
+from WatchFolder import DropWatcher, WATCH_SIDE
+from PathQuery import compile_query
 
-class Extractor:
-    def __init__(self):
-        self.sample_dirs = {}
-        self.indexed_files = {}
+# Memory budget of the caches and indexes (in MB), tracemalloc adds real allocation numbers
+MEMORY_BUDGET_MB = 512
+TRACK_MEMORY_ALLOCATIONS = False
 
-    # Sets the directory for patent files and extracts them if necessary.
-    # If the directory is a ZIP file, it is extracted to a temporary directory.
-    # Checks if the ZIP directory exists first, if not, extracts the ZIP file.
-    def set_directory(self, directory, side):
-        if directory.endswith('.zip'):
-            extract_dir = directory[:-4] # for cases with .zip
-            if not os.path.exists(extract_dir):
-                try:
-                    with zipfile.ZipFile(directory, 'r') as zip_ref:
-                        zip_ref.extractall(extract_dir)
-                    messagebox.showinfo("Information", f"Extracted ZIP file for {side}.")
-                except zipfile.BadZipFile:
-                    messagebox.showerror("Error", f"Invalid ZIP file for {side}.")
-                    return False
-            directory = extract_dir
-
-        if not os.path.isdir(directory):
-            messagebox.showerror("Error", f"Invalid directory path for {side}.")
-            return False
-        
-        if side in self.sample_dirs and self.sample_dirs[side] == directory:
-            return True
-        
-        self.sample_dirs[side] = directory
-        return self.preprocess_files(side)
-
-    # Processes files in the set directory and indexes them by patent number.
-    # Only runs if the index file does not exist.
-    def preprocess_files(self, side):
-        directory = self.sample_dirs[side]
-        index_file_path = os.path.join(directory, 'patent_file_index.pkl')
-
-        if os.path.exists(index_file_path):
-            with open(index_file_path, 'rb') as f:
-                self.indexed_files[side] = pickle.load(f)
-            messagebox.showinfo("Information", f"Files preprocessed for {side}. READY TO USE.")
-        else:
-            self.indexed_files[side] = {}
-            for filename in os.listdir(directory):
-                if filename.endswith('.xml'):
-                    patent_number = self.extract_patent_number(filename)
-                    if patent_number:
-                        self.indexed_files[side][patent_number] = os.path.join(directory, filename)
-            with open(index_file_path, 'wb') as f:
-                pickle.dump(self.indexed_files[side], f)
-
-        return True
-
-    def extract_patent_number(self, filename):
-        parts = filename.split('-')
-        if len(parts) > 2 and parts[2].isdigit():
-            return parts[2].lstrip('0')
-        return None
-
-    def find_xml_file_for_patent(self, patent_number, side):
-        return self.indexed_files[side].get(patent_number.lstrip('0')) if side in self.indexed_files else None
-
-    # Prases the entire XML tree.
-    # Lists all UNIQUE elements in the given XML file.
-    def list_all_elements(self, file_path):
-        elements = set()
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            for elem in root.iter():
-                elements.add(elem.tag)
-        except ET.ParseError:
-            messagebox.showerror("Error", f"Failed to parse XML in {file_path}")
-
-        return sorted(elements)
-    
-    # Retrieves and formats the content of a specific XML element and its children.
-    def get_element_content(self, file_path, element_name):
-        content = ''
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            for elem in root.findall('.//' + element_name):
-                xmlstr = minidom.parseString(ET.tostring(elem)).toprettyxml(indent="  ")
-                content += '\n'.join(xmlstr.split('\n')[1:])  # Remove the XML declaration
-                content += '\n\n'
-        except ET.ParseError:
-            messagebox.showerror("Error", f"Failed to parse XML in {file_path}")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-        
-        return content
+# Time spent inserting element content before handing control back to the event loop (seconds)
+RENDER_SLICE_SECONDS = 0.015
+
+# Parsed documents kept on disk between sessions (size cap in MB, least recently used deleted first)
+DOCUMENT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.patent_viewer', 'document_cache')
+DOCUMENT_CACHE_MB = 256
+
+# Shared folder receiving CA-WEEKLY-BFT-UPDATE-*.zip drops, ingested as they arrive (None to turn off)
+WATCH_FOLDER = None
 
 class PatentApp(tk.Tk):
     def __init__(self):
         super().__init__()
-        self.extractor = Extractor()
+        self.extractor = ExtractorEngine(MemoryBudget.from_megabytes(MEMORY_BUDGET_MB, TRACK_MEMORY_ALLOCATIONS),
+                                         document_cache=DocumentCache.from_megabytes(DOCUMENT_CACHE_DIR, DOCUMENT_CACHE_MB))
+        # The engine works in background threads, its events and results are handed to Tk through this queue
+        self.engine_events = queue.Queue()
+        # Progressive renders in progress, per results area: (after id, chunk generator)
+        self.render_jobs = {}
+        self.extractor.add_listener(self.engine_events.put)
+        self.prefetcher = Prefetcher(self.extractor)
+        # Progress of the background drop ingest, shown next to the memory usage
+        self.watch_status = ""
+        self.watcher = DropWatcher(WATCH_FOLDER, self.extractor).start() if WATCH_FOLDER else None
         self.title("Patent Document Viewer")
         self.geometry("1200x600+30+20")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         self.create_widgets()
+        self.process_engine_events()
+
+    # Shows engine messages and finishes directory loads on the Tk thread (polled every 50 ms).
+    def process_engine_events(self):
+        while True:
+            try:
+                item = self.engine_events.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, Event):
+                if item.side == WATCH_SIDE:
+                    # Background ingest, no dialog
+                    self.watch_status = item.message
+                elif item.kind == 'error':
+                    messagebox.showerror("Error", item.message)
+                else:
+                    messagebox.showinfo("Information", item.message)
+            else:
+                side, result = item
+                self.on_directory_loaded(side, result)
+        self.after(50, self.process_engine_events)
+
+    def on_close(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.prefetcher.shutdown()
+        self.extractor.shutdown()
+        self.destroy()
 
     # Creates initial widgets like the status label.
     # Added short delay to simulate loading time.
@@ -137,10 +125,30 @@ class PatentApp(tk.Tk):
 
     def remove_initial_message(self):
         self.status_label.pack_forget()
+        self.memory_label = tk.Label(self, text="", font=('Helvetica', 8), anchor=tk.E)
+        self.memory_label.pack(side=tk.BOTTOM, fill=tk.X)
         self.paned_window = tk.PanedWindow(self, orient=tk.HORIZONTAL, sashrelief=tk.RAISED, sashwidth=6)
         self.paned_window.pack(fill=tk.BOTH, expand=True)
         self.create_side_widgets("left")
         self.create_side_widgets("right")
+        self.update_memory_label()
+
+    # Refreshes the memory metric every 2 seconds.
+    def update_memory_label(self):
+        text = self.extractor.memory_budget.describe()
+        if self.watch_status:
+            text = f"{self.watch_status}   |   {text}"
+        self.memory_label.config(text=text)
+        self.after(2000, self.update_memory_label)
+
+    # Clears a results area along with its tags, so old bindings do not pile up over a session.
+    # Also stops any content still being rendered in it.
+    def clear_results(self, results_text):
+        self.cancel_render(results_text)
+        results_text.delete('1.0', tk.END)
+        for tag in results_text.tag_names():
+            if tag != 'sel':
+                results_text.tag_delete(tag)
 
     # Configures and sets up widgets for each side of the application's paned window (left + right).
     # Sets up all the necessary widgets for directory input, patent number input, and filtering.
@@ -167,11 +175,17 @@ class PatentApp(tk.Tk):
         patent_number_label = tk.Label(frame, text=f"Search Patent {side.capitalize()}:")
         patent_number_entry = tk.Entry(frame)
         search_button = tk.Button(frame, text="Search", command=lambda: self.perform_search(patent_number_entry.get(), side))
+        similar_button = tk.Button(frame, text="Find Similar", command=lambda: self.show_similar_patents(side))
         results_text = scrolledtext.ScrolledText(frame, height=10)
         
         # Bind the 'Enter' key to search patents
         patent_number_entry.bind('<Return>', lambda event: self.perform_search(patent_number_entry.get(), side))
 
+        # Type-ahead dropdown, only visible while there are suggestions
+        suggestions_listbox = tk.Listbox(frame, height=6)
+        patent_number_entry.bind('<KeyRelease>', lambda event: self.on_patent_number_typed(event, side))
+        suggestions_listbox.bind('<<ListboxSelect>>', lambda event: self.on_suggestion_selected(side))
+
         # Widgets for filtering, initially not visible
         filter_label = tk.Label(frame, text="Filter:")
         filter_entry = tk.Entry(frame)
@@ -185,7 +199,9 @@ class PatentApp(tk.Tk):
         setattr(self, f"{side}_set_directory_button", set_directory_button)
         setattr(self, f"{side}_patent_number_label", patent_number_label)
         setattr(self, f"{side}_patent_number_entry", patent_number_entry)
+        setattr(self, f"{side}_suggestions_listbox", suggestions_listbox)
         setattr(self, f"{side}_search_button", search_button)
+        setattr(self, f"{side}_similar_button", similar_button)
         setattr(self, f"{side}_results_text", results_text)
         setattr(self, f"{side}_filter_label", filter_label)
         setattr(self, f"{side}_filter_entry", filter_entry)
@@ -198,9 +214,20 @@ class PatentApp(tk.Tk):
         setattr(self, f"{side}_filter_entry", self.filter_entry)                                                                                                                                                                                                                    # Fatmike (Michael Haddad) was here #
 
     # Sets the directory for a side and processes files if directory is valid.
+    # Loading runs in the background, so the other side can load at the same time.
     def set_directory(self, directory, side):
-        if self.extractor.set_directory(directory, side):
+        directory_open_label = getattr(self, f"{side}_directory_open_label")
+        directory_open_label.config(text=f"Loading {directory} ...")
+        directory_open_label.pack(pady=2, after=getattr(self, f"{side}_set_directory_button"))
+        self.extractor.set_directory_async(directory, side, lambda result: self.engine_events.put((side, result)))
+
+    def on_directory_loaded(self, side, result):
+        directory_open_label = getattr(self, f"{side}_directory_open_label")
+        if result.ok:
+            directory_open_label.config(text=f"Open: {result.value}")
             self.show_patent_widgets(side)
+        else:
+            directory_open_label.config(text="")
 
     # Shows the patent search widgets for a side after a directory is set.
     def show_patent_widgets(self, side):
@@ -223,10 +250,12 @@ class PatentApp(tk.Tk):
     def display_elements(self, side, file_path):
         results_text = getattr(self, f"{side}_results_text")
         results_text.config(state=tk.NORMAL)
-        results_text.delete('1.0', tk.END)
+        self.clear_results(results_text)
         
-        elements = self.extractor.list_all_elements(file_path)
-        for element in elements:
+        result = self.extractor.list_all_elements(file_path)
+        if not result.ok:
+            messagebox.showerror("Error", result.error)
+        for element in result.value:
             tag = element.replace(':', '_')
             results_text.insert(tk.END, element + '\n', tag)
             
@@ -249,6 +278,7 @@ class PatentApp(tk.Tk):
         # 2) If the patent number is incorrect, an error message is displayed.
     def perform_search(self, patent_number, side):
         results_text = getattr(self, f"{side}_results_text")
+        self.hide_suggestions(side)
 
         if not patent_number:
             messagebox.showwarning("Warning", f"Patent number for {side} cannot be empty.")
@@ -257,9 +287,81 @@ class PatentApp(tk.Tk):
 
         if file_path:
             setattr(self, f"{side}_file_path", file_path)
+            setattr(self, f"{side}_patent_number", patent_number)
+            self.prefetcher.on_patent_opened(patent_number, side, ["left", "right"])
             self.display_elements(side, file_path)
+            self.prefetcher.on_patent_displayed(file_path, side)
+            getattr(self, f"{side}_similar_button").pack(pady=2, before=results_text)
         else:
-            messagebox.showerror("Error", f"The patent for {side} provided does not exist.")
+            suggestions = self.extractor.suggest_patent_numbers(patent_number, side, limit=5)
+            hint = f"\nDid you mean: {', '.join(suggestions)}?" if suggestions else ""
+            messagebox.showerror("Error", f"The patent for {side} provided does not exist.{hint}")
+
+    # Refreshes the type-ahead dropdown on every keystroke (arrows/Enter are left to the entry).
+    def on_patent_number_typed(self, event, side):
+        if event.keysym in ('Return', 'Up', 'Down', 'Escape'):
+            if event.keysym == 'Escape':
+                self.hide_suggestions(side)
+            return
+        patent_number_entry = getattr(self, f"{side}_patent_number_entry")
+        suggestions_listbox = getattr(self, f"{side}_suggestions_listbox")
+        suggestions = self.extractor.suggest_patent_numbers(patent_number_entry.get(), side)
+
+        suggestions_listbox.delete(0, tk.END)
+        if not suggestions:
+            self.hide_suggestions(side)
+            return
+        for suggestion in suggestions:
+            suggestions_listbox.insert(tk.END, suggestion)
+        suggestions_listbox.config(height=len(suggestions))
+        if not suggestions_listbox.winfo_ismapped():
+            suggestions_listbox.pack(after=patent_number_entry)
+
+    # Fills the entry with the clicked suggestion and opens that patent.
+    def on_suggestion_selected(self, side):
+        suggestions_listbox = getattr(self, f"{side}_suggestions_listbox")
+        selection = suggestions_listbox.curselection()
+        if not selection:
+            return
+        patent_number = suggestions_listbox.get(selection[0])
+        patent_number_entry = getattr(self, f"{side}_patent_number_entry")
+        patent_number_entry.delete(0, tk.END)
+        patent_number_entry.insert(0, patent_number)
+        self.perform_search(patent_number, side)
+
+    def hide_suggestions(self, side):
+        suggestions_listbox = getattr(self, f"{side}_suggestions_listbox", None)
+        if suggestions_listbox is not None:
+            suggestions_listbox.pack_forget()
+
+    # Lists the patents most similar to the one currently opened on a side.
+    # Each result is clickable and opens that patent on the same side.
+    def show_similar_patents(self, side):
+        results_text = getattr(self, f"{side}_results_text")
+        patent_number = getattr(self, f"{side}_patent_number", None)
+        file_path = getattr(self, f"{side}_file_path", None)
+        if not patent_number:
+            return
+
+        results_text.config(state=tk.NORMAL)
+        self.clear_results(results_text)
+
+        # "Back" button
+        go_back_tag = "go_back"
+        results_text.insert(tk.END, " BACK \n\n", go_back_tag)
+        results_text.tag_bind(go_back_tag, '<Button-1>', lambda event: self.display_elements(side, file_path))
+        results_text.tag_config(go_back_tag, foreground='blue', underline=1)
+
+        similar_patents = self.extractor.find_similar_patents(patent_number, side)
+        if not similar_patents:
+            results_text.insert(tk.END, "No similar patent found.\n")
+        for number, score in similar_patents:
+            tag = f"similar_{number}"
+            results_text.insert(tk.END, f"{number}  ({score:.0%})\n", tag)
+            results_text.tag_bind(tag, '<Enter>', lambda event, t=tag: results_text.tag_config(t, background='yellow'))
+            results_text.tag_bind(tag, '<Leave>', lambda event, t=tag: results_text.tag_config(t, background=''))
+            results_text.tag_bind(tag, '<Button-1>', lambda event, n=number: self.perform_search(n, side))
+        results_text.config(state=tk.DISABLED)
 
     # Handles the event when an XML element is clicked, displaying its content.
     # Display and bind the "Back" button to return to the list of elements.
@@ -268,10 +370,13 @@ class PatentApp(tk.Tk):
         # 2) Clearing the current content
         # 3) Inserting the "Back" button
     def on_element_click(self, element, file_path, side):
+        open_files = {s: getattr(self, f"{s}_file_path", None) for s in ("left", "right")}
+        self.prefetcher.on_element_clicked(element, side, open_files)
+
         # Enable text modification and clear existing content
         results_text = getattr(self, f"{side}_results_text")
         results_text.config(state=tk.NORMAL)
-        results_text.delete('1.0', tk.END)
+        self.clear_results(results_text)
         
         # "Back" button
         go_back_tag = "go_back"
@@ -279,22 +384,67 @@ class PatentApp(tk.Tk):
         results_text.tag_bind(go_back_tag, '<Button-1>', lambda event: self.display_elements(side, file_path))
         results_text.tag_config(go_back_tag, foreground='blue', underline=1)
 
-        # Display the content for the selected element
-        content = self.extractor.get_element_content(file_path, element)
-        results_text.insert(tk.END, content)
+        # Display the content for the selected element, a few chunks at a time
         results_text.config(state=tk.DISABLED)
+        result = self.extractor.stream_element_content(file_path, element)
+        if not result.ok:
+            messagebox.showerror("Error", result.error)
+            return
+        self.render_progressively(results_text, result.value)
+
+    # Inserts chunks for RENDER_SLICE_SECONDS, then lets the event loop run before the next slice.
+    # The first slice is inserted right away so the first screenful appears immediately.
+    def render_progressively(self, results_text, chunks):
+        key = str(results_text)
+
+        def render_next():
+            deadline = time.perf_counter() + RENDER_SLICE_SECONDS
+            results_text.config(state=tk.NORMAL)
+            try:
+                while time.perf_counter() < deadline:
+                    results_text.insert(tk.END, next(chunks))
+            except StopIteration:
+                self.render_jobs.pop(key, None)
+                return
+            except Exception as e:
+                self.render_jobs.pop(key, None)
+                messagebox.showerror("Error", str(e))
+                return
+            finally:
+                results_text.config(state=tk.DISABLED)
+            self.render_jobs[key] = (self.after(1, render_next), chunks)
+
+        render_next()
+
+    # Stops the render in progress in a results area (another element was clicked, Back, ...).
+    def cancel_render(self, results_text):
+        job = self.render_jobs.pop(str(results_text), None)
+        if job is not None:
+            after_id, chunks = job
+            self.after_cancel(after_id)
+            chunks.close()
 
     # Filters and displays elements based on the filter input from the user.
+    # A filter starting with '/' is a path query (eg: //claim[@num='0001']), shown as one clickable entry.
     def on_filter_update(self, side):
         results_text = getattr(self, f"{side}_results_text")
-        filter_text = getattr(self, f"{side}_filter_entry").get().lower()
+        raw_filter = getattr(self, f"{side}_filter_entry").get().strip()
+        filter_text = raw_filter.lower()
         file_path = getattr(self, f"{side}_file_path", None)
 
         if file_path:
             # Clear existing text and re-display all elements filtered
             results_text.config(state=tk.NORMAL)
-            results_text.delete('1.0', tk.END)
-            elements = self.extractor.list_all_elements(file_path)
+            self.clear_results(results_text)
+            elements = self.extractor.list_all_elements(file_path).value
+            if raw_filter.startswith('/'):
+                try:
+                    compile_query(raw_filter)
+                    elements = [raw_filter]
+                except ValueError:
+                    # Not a complete query yet (still being typed)
+                    elements = []
+                filter_text = ''
 
             for element in elements:
                 if filter_text in element.lower():
@@ -0,0 +1,270 @@
+import os
+import sys
+import json
+import time
+import fnmatch
+import socket
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from PatentEngine import ExtractorEngine, Result
+
+'''
+
+Watch-folder auto-ingest of the weekly drops (CA-WEEKLY-BFT-UPDATE-*.zip).
+
+- The folder is polled with os.scandir(), only the size and modification time of matching files
+  are compared between polls (no file is opened until it looks complete)
+- A file is ingested once its size and time have not changed for settle_seconds AND its ZIP
+  central directory is readable, so archives still being copied are left alone
+- Ingesting is ExtractorEngine.set_directory() on the watcher's own worker thread and build process
+  (the viewer's loads are never queued behind a drop): the ZIP is extracted next to itself and the
+  patent/similarity indexes are written, opening it later in the viewer is instant
+- Ingested archives are recorded in a small JSON ledger (name, size, time), a restarted watcher
+  does not ingest them again, a drop replaced by a new file with the same name is extracted and
+  indexed again (set_directory(rebuild=True))
+- Several viewers can watch the same share: a drop is claimed with a lock file next to the ledger
+  (<name>.lock), the others leave it alone and find it in the ledger once it is done
+
+Run this file to watch a folder from the command line, or set WATCH_FOLDER in UserExperience(2.1).py.
+
+'''
+
+WATCH_PATTERN = 'CA-WEEKLY-BFT-UPDATE-*.zip'
+# Engine side used for the drops being ingested (the viewer keeps using left/right)
+WATCH_SIDE = 'watch'
+LEDGER_NAME = 'ingested_drops.json'
+# A claim older than this is left over by a viewer that stopped while ingesting, it is taken over
+STALE_CLAIM_SECONDS = 6 * 60 * 60
+
+class DropWatcher:
+    # ledger_dir defaults to the watched folder, use another one if the share is read-only.
+    # on_ingested(file_path, result) is called from a worker thread once a drop is done.
+    def __init__(self, watch_dir, engine, pattern=WATCH_PATTERN, poll_seconds=10.0, settle_seconds=30.0,
+                 side=WATCH_SIDE, ledger_dir=None, on_ingested=None):
+        self.watch_dir = watch_dir
+        self.engine = engine
+        self.pattern = pattern
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.side = side
+        self.on_ingested = on_ingested
+        self.ledger_dir = ledger_dir or watch_dir
+        self.ledger_path = os.path.join(self.ledger_dir, LEDGER_NAME)
+        self.lock = threading.Lock()
+        self.executor = None
+        # Build process of the drops, separate from the engine's (None if the engine builds in-process)
+        self.build_executor = None
+        # name -> future of the drops queued or being ingested
+        self.futures = {}
+        # name -> (size, mtime) of the archives already ingested, or that failed as they are
+        self.ingested = self._load_ledger()
+        self.failed = {}
+        # name -> ((size, mtime), time that signature was first seen)
+        self.pending = {}
+        self.ingesting = set()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _load_ledger(self):
+        if not os.path.exists(self.ledger_path):
+            return {}
+        try:
+            with open(self.ledger_path, 'r') as f:
+                return {name: tuple(signature) for name, signature in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable ledger {self.ledger_path}: {e}")
+            return {}
+
+    # Merged with the ledger on disk, other viewers may have recorded drops since it was read
+    def _save_ledger(self):
+        ledger = self._load_ledger()
+        ledger.update(self.ingested)
+        self.ingested = ledger
+        temporary_path = f"{self.ledger_path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_path, 'w') as f:
+                json.dump({name: list(signature) for name, signature in ledger.items()}, f, indent=2)
+            os.replace(temporary_path, self.ledger_path)
+        except OSError as e:
+            print(f"Could not write ledger {self.ledger_path}: {e}")
+
+    def _claim_path(self, name):
+        return os.path.join(self.ledger_dir, name + '.lock')
+
+    # Creates the lock file of a drop, False if another viewer holds it.
+    # A folder where no lock file can be written (read-only share) does not stop the ingest.
+    def _claim(self, name):
+        claim_path = self._claim_path(name)
+        for _ in range(2):
+            try:
+                fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(claim_path) < STALE_CLAIM_SECONDS:
+                        return False
+                    os.remove(claim_path)
+                except FileNotFoundError:
+                    pass
+                continue
+            except OSError as e:
+                print(f"Cannot claim {name} in {self.ledger_dir}: {e}")
+                return True
+            with os.fdopen(fd, 'w') as f:
+                f.write(f"{socket.gethostname()} {os.getpid()}\n")
+            return True
+        return False
+
+    def _release(self, name):
+        try:
+            os.remove(self._claim_path(name))
+        except OSError:
+            pass
+
+    # {name: (size, mtime)} of the matching files, from directory entries only
+    def snapshot(self):
+        signatures = {}
+        try:
+            with os.scandir(self.watch_dir) as entries:
+                for entry in entries:
+                    if fnmatch.fnmatch(entry.name, self.pattern) and entry.is_file():
+                        stat = entry.stat()
+                        signatures[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError as e:
+            print(f"Cannot list {self.watch_dir}: {e}")
+        return signatures
+
+    # One poll: starts the ingest of every archive that stopped changing.
+    # Returns the names of the archives started.
+    def poll_once(self, now=None):
+        now = time.monotonic() if now is None else now
+        started = []
+        signatures = self.snapshot()
+        with self.lock:
+            for name in list(self.pending):
+                if name not in signatures:
+                    del self.pending[name]
+            for name, signature in sorted(signatures.items()):
+                if name in self.ingesting or self.ingested.get(name) == signature or self.failed.get(name) == signature:
+                    continue
+                seen = self.pending.get(name)
+                if seen is None or seen[0] != signature:
+                    # New or still growing, the settle time starts again
+                    self.pending[name] = (signature, now)
+                    continue
+                if now - seen[1] < self.settle_seconds:
+                    continue
+                if not zipfile.is_zipfile(os.path.join(self.watch_dir, name)):
+                    self.pending[name] = (signature, now)
+                    continue
+                if not self._claim(name):
+                    # Another viewer is ingesting it, the ledger tells once it is done
+                    self.pending[name] = (signature, now)
+                    self.ingested.update(self._load_ledger())
+                    continue
+                if self._load_ledger().get(name) == signature:
+                    # Done by another viewer since the last poll
+                    self._release(name)
+                    self.ingested[name] = signature
+                    del self.pending[name]
+                    continue
+                del self.pending[name]
+                self.ingesting.add(name)
+                # Ingested (or failed) before with another signature: the archive was replaced
+                started.append((name, signature, name in self.ingested or name in self.failed))
+            if started and self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='drop-ingest')
+                if self.engine.use_processes:
+                    self.build_executor = ProcessPoolExecutor(max_workers=1)
+            executor = self.executor
+        for name, signature, replaced in started:
+            future = executor.submit(self._ingest, name, signature, replaced)
+            with self.lock:
+                if name in self.ingesting:
+                    self.futures[name] = future
+        return [name for name, _, _ in started]
+
+    def _ingest(self, name, signature, replaced=False):
+        try:
+            result = self.engine.set_directory(os.path.join(self.watch_dir, name), self.side,
+                                               rebuild=replaced, build_executor=self.build_executor)
+        except Exception as e:
+            result = Result.failure(f"Failed to ingest {name}: {e}")
+        self._on_done(name, signature, result)
+
+    def _on_done(self, name, signature, result):
+        with self.lock:
+            self.ingesting.discard(name)
+            self.futures.pop(name, None)
+            if result.ok:
+                self.ingested[name] = signature
+                self._save_ledger()
+            else:
+                # Not retried until the file changes
+                self.failed[name] = signature
+            self._release(name)
+        if self.on_ingested is not None:
+            self.on_ingested(os.path.join(self.watch_dir, name), result)
+
+    def is_idle(self):
+        with self.lock:
+            return not self.ingesting
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            self.poll_once()
+            self.stop_event.wait(self.poll_seconds)
+
+    # Polls in a daemon thread until stop() is called
+    def start(self):
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._loop, name='drop-watcher', daemon=True)
+            self.thread.start()
+        return self
+
+    # Drops being ingested are finished in the background, the queued ones are dropped (and their claims released)
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            executor, self.executor = self.executor, None
+            build_executor, self.build_executor = self.build_executor, None
+            for name, future in list(self.futures.items()):
+                if future.cancel():
+                    del self.futures[name]
+                    self.ingesting.discard(name)
+                    self._release(name)
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if build_executor is not None:
+            build_executor.shutdown(wait=False)
+
+def setup_paths():
+    data_dir = 'C:/Users/haddadm1/Desktop/Random Things/dd_Patent_Element_Testing'
+    watch_dir = os.path.join(data_dir, 'Weekly Drops')
+    return data_dir, watch_dir
+
+# Watches the folder (or the one given on the command line) until Ctrl-C
+def main():
+    data_dir, watch_dir = setup_paths()
+    if len(sys.argv) > 1:
+        watch_dir = sys.argv[1]
+    engine = ExtractorEngine()
+    engine.add_listener(lambda event: print(f"[{event.kind}] {event.message}"))
+    watcher = DropWatcher(watch_dir, engine,
+                          on_ingested=lambda file_path, result: print(f"Ingested {file_path}" if result.ok else result.error))
+    print(f"Watching {watch_dir} for {watcher.pattern} (Ctrl-C to stop)")
+    watcher.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    watcher.stop()
+    engine.shutdown()
+
+if __name__ == "__main__":
+    main()
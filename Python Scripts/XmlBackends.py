@@ -0,0 +1,176 @@
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+import os
+import sys
+import time
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+'''
+
+Pluggable XML parser backends, each caller asks for the cheapest one that can do its job:
+
+- 'tags'  : raw expat start-element handler, only collects tag names (no tree is built)
+- 'tree'  : xml.etree.ElementTree, full tree (picklable, used by the GUI caches)
+- 'lxml'  : lxml.etree full tree, ONLY available if lxml is installed
+
+Tag names are returned the same way by every backend ({namespace}local for namespaced tags),
+and every parse error is raised as ET.ParseError so callers keep a single except clause.
+
+Run this file to compare the throughput of the available backends on the same corpus.
+
+'''
+
+# Tags of one document, as collected by the tags-only backend
+class TagScan:
+    __slots__ = ('tags', 'element_count')
+
+    def __init__(self, tags, element_count):
+        self.tags = tags
+        self.element_count = element_count
+
+class ExpatTagsBackend:
+    name = 'tags'
+    builds_tree = False
+
+    # source is a file path or the raw bytes of the document
+    def scan(self, source):
+        names = []
+        append = names.append
+        parser = expat.ParserCreate(namespace_separator='}')
+        parser.StartElementHandler = lambda name, attributes: append(name)
+        try:
+            if isinstance(source, (bytes, bytearray)):
+                parser.Parse(source, True)
+            else:
+                with open(source, 'rb') as f:
+                    parser.ParseFile(f)
+        except expat.ExpatError as e:
+            raise ET.ParseError(str(e)) from None
+        # Same naming as ElementTree: 'uri}local' -> '{uri}local'
+        tags = {'{' + name if '}' in name else name for name in set(names)}
+        return TagScan(tags, len(names))
+
+    def tags(self, source):
+        return self.scan(source).tags
+
+class ElementTreeBackend:
+    name = 'tree'
+    builds_tree = True
+
+    def parse(self, source):
+        if isinstance(source, (bytes, bytearray)):
+            return ET.fromstring(source)
+        return ET.parse(source).getroot()
+
+    def scan(self, source):
+        root = self.parse(source)
+        tags = set()
+        element_count = 0
+        for elem in root.iter():
+            tags.add(elem.tag)
+            element_count += 1
+        return TagScan(tags, element_count)
+
+    def tags(self, source):
+        return self.scan(source).tags
+
+    def tostring(self, elem):
+        return ET.tostring(elem)
+
+class LxmlBackend:
+    name = 'lxml'
+    builds_tree = True
+
+    def __init__(self):
+        if lxml_etree is None:
+            raise ImportError("lxml is not installed")
+        self.parser = lxml_etree.XMLParser(resolve_entities=False, no_network=True)
+
+    def parse(self, source):
+        try:
+            if isinstance(source, (bytes, bytearray)):
+                return lxml_etree.fromstring(source, self.parser)
+            return lxml_etree.parse(source, self.parser).getroot()
+        except lxml_etree.XMLSyntaxError as e:
+            raise ET.ParseError(str(e)) from None
+
+    def scan(self, source):
+        root = self.parse(source)
+        tags = set()
+        element_count = 0
+        # Comments and processing instructions are skipped, like ElementTree does
+        for elem in root.iter(lxml_etree.Element):
+            tags.add(elem.tag)
+            element_count += 1
+        return TagScan(tags, element_count)
+
+    def tags(self, source):
+        return self.scan(source).tags
+
+    def tostring(self, elem):
+        return lxml_etree.tostring(elem)
+
+BACKENDS = {
+    'tags': ExpatTagsBackend,
+    'tree': ElementTreeBackend,
+    'lxml': LxmlBackend,
+}
+
+def available_backends():
+    return [name for name in BACKENDS if name != 'lxml' or lxml_etree is not None]
+
+# Returns the cheapest backend for a need:
+    # 'tags' -> expat, no tree built
+    # 'tree' -> ElementTree (objects must stay picklable and work with ET/minidom helpers)
+    # 'fast_tree' -> lxml when installed, ElementTree otherwise
+def get_backend(need='tree'):
+    if need == 'tags':
+        return ExpatTagsBackend()
+    if need == 'fast_tree' and lxml_etree is not None:
+        return LxmlBackend()
+    if need in ('tree', 'fast_tree'):
+        return ElementTreeBackend()
+    raise ValueError(f"Unknown parser need: {need}")
+
+# Parses every XML file of a folder with one backend and returns (files, bytes, seconds, tags found)
+def benchmark_backend(backend, xml_files):
+    all_tags = set()
+    total_bytes = 0
+    start_time = time.perf_counter()
+    for file_path in xml_files:
+        try:
+            all_tags.update(backend.tags(file_path))
+        except ET.ParseError as e:
+            print(f"Error parsing {file_path}: {e}")
+        total_bytes += os.path.getsize(file_path)
+    return len(xml_files), total_bytes, time.perf_counter() - start_time, all_tags
+
+def setup_paths():
+    data_dir = 'C:/Users/haddadm1/Desktop/Random Things/dd_Patent_Element_Testing'
+    sample_dir = os.path.join(data_dir, 'Sample')
+    return data_dir, sample_dir
+
+# Throughput comparison of every available backend on the same corpus
+def main():
+    data_dir, sample_dir = setup_paths()
+    if len(sys.argv) > 1:
+        sample_dir = sys.argv[1]
+    xml_files = sorted(os.path.join(sample_dir, f) for f in os.listdir(sample_dir) if f.lower().endswith('.xml'))
+
+    reference_tags = None
+    for name in available_backends():
+        files, total_bytes, seconds, tags = benchmark_backend(BACKENDS[name](), xml_files)
+        same = reference_tags is None or tags == reference_tags
+        reference_tags = tags if reference_tags is None else reference_tags
+        mb_per_s = (total_bytes / (1024 * 1024)) / seconds if seconds > 0 else 0.0
+        files_per_s = files / seconds if seconds > 0 else 0.0
+        print(f"{name:<6} {files:>8} files {seconds:>9.4f}s {files_per_s:>10.1f} files/s {mb_per_s:>8.2f} MB/s  same tags: {same}")
+    if lxml_etree is None:
+        print("lxml is not installed, lxml backend skipped.")
+
+if __name__ == "__main__":
+    main()